@@ -1,62 +1,87 @@
 import heapq
+import itertools
+import time
 
 class PriorityQueue(object):
+    """
+    Priority queue with O(1) membership tests. Pushing a value that is already queued
+    changes its priority; the old heap entry is left in place and skipped when popped.
+    """
     def __init__(self):
         self.queue = []
+        self.entries = {}
+        self.counter = itertools.count()
 
     def push(self, prio, v):
-        heapq.heappush(self.queue, (prio, v))
+        entry = [prio, next(self.counter), v, True]
+        old = self.entries.get(v)
+        if old is not None:
+            old[3] = False
+        self.entries[v] = entry
+        heapq.heappush(self.queue, entry)
 
     def pop(self):
-        return heapq.heappop(self.queue)
+        while self.queue:
+            prio, count, v, alive = heapq.heappop(self.queue)
+            if alive:
+                del self.entries[v]
+                return prio, v
+        raise IndexError('pop from empty priority queue')
 
     def __contains__(self, val):
-        for p, v in self.queue:
-            if v == val:
-                return True
-        return False
+        return val in self.entries
 
     def __len__(self):
-        return len(self.queue)
+        return len(self.entries)
 
-def astar(start, goal, g_fcn, h_fcn, find_neighbours_fcn):
-    def reconstruct_path(came_from, current_node):
-        if current_node in came_from:
-            p = reconstruct_path(came_from, came_from[current_node])
-            return p + (current_node,)
-        else:
-            return (current_node,)
+def reconstruct_path(came_from, current_node):
+    path = [current_node]
+    while current_node in came_from:
+        current_node = came_from[current_node]
+        path.append(current_node)
+    path.reverse()
+    return tuple(path)
 
+def astar(start, goal, g_fcn, h_fcn, find_neighbours_fcn, max_expansions=None, max_nodes=None, stats=None,
+          deadline=None):
+    """
+    Finds the cheapest path from start to goal. Returns the cost and the path, or
+    (0, ()) if there is no path or the search expands more than max_expansions nodes,
+    reaches more than max_nodes nodes or is still running at the time deadline. The
+    number of expanded nodes is added to stats['expansions'] if a stats dict is given.
+    """
     closed_list = set()
     open_list = PriorityQueue()
     open_list.push(h_fcn(start), start)
     g_score = {start : 0.0}
     came_from = {}
+    expansions = 0
     while open_list:
         f, node = open_list.pop()
         if node == goal:
+            if stats is not None:
+                stats['expansions'] = stats.get('expansions', 0) + expansions
             return f, reconstruct_path(came_from, goal)
         closed_list.add(node)
+        expansions += 1
+        if max_expansions is not None and expansions > max_expansions:
+            break
+        if deadline is not None and expansions % 64 == 0 and time.time() > deadline:
+            break
         neighbours = find_neighbours_fcn(node)
         for neighbour in neighbours:
             if neighbour in closed_list:
                 continue
             new_g = g_score[node] + g_fcn(node, neighbour)
-
-            new_is_better = False
-            if neighbour not in open_list:
-                f = new_g + h_fcn(neighbour)
-                open_list.push(f, neighbour)
-                new_is_better = True
-            elif new_g < g_score[neighbour]:
-                new_is_better = True
-            else:
-                new_is_better = False
-
-            if new_is_better:
+            if neighbour not in g_score or new_g < g_score[neighbour]:
                 came_from[neighbour] = node
                 g_score[neighbour] = new_g
+                open_list.push(new_g + h_fcn(neighbour), neighbour)
+        if max_nodes is not None and len(g_score) > max_nodes:
+            break
 
+    if stats is not None:
+        stats['expansions'] = stats.get('expansions', 0) + expansions
     return 0, tuple()
 
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+import argparse
+import clever_solver
+import game
+import glob
+import json
+import multiprocessing as mp
+import os
+import random
+import random_solver
+import resource
+import search_solver
+import time
+
+SOLVERS = {'clever': clever_solver.CleverSolver,
+           'random': random_solver.RandomSolver,
+           'search': search_solver.SearchSolver,
+}
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+def problem_file(problem):
+    return os.path.join(DATA_DIR, 'problem_%d.json' % problem)
+
+def run_job(arg):
+    """
+    Solves one seed of a problem and measures it. Run in a fresh process per job so that
+    the peak RSS belongs to that job only.
+    """
+    solver, filename, seed_index, max_units = arg
+    problem = game.Problem.load(filename)
+    seed = problem.source_seeds[seed_index]
+    random.seed(seed)
+    g = problem.make_game(seed_index, game.BOARDS[solver.board])
+    if max_units is not None:
+        g.max_units = min(g.max_units, max_units)
+    start = time.time()
+    commands = solver.solve(g, 0)
+    wall_time = time.time() - start
+    units = g.num_units if g.unit is None else g.num_units - 1
+    return {"problemId": problem.id,
+            "seed": seed,
+            "wall_time": wall_time,
+            "units": units,
+            "units_per_second": units / wall_time if wall_time > 0 else 0.0,
+            "moves": len(commands),
+            "moves_per_second": len(commands) / wall_time if wall_time > 0 else 0.0,
+            # Kilobytes on Linux
+            "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "score": g.score,
+            "timing": solver.timer.summary() if solver.timer is not None else None,
+    }
+
+def compare(results, baseline):
+    old = dict(((r["problemId"], r["seed"]), r) for r in baseline["results"])
+    for r in results:
+        o = old.get((r["problemId"], r["seed"]))
+        if o is None:
+            continue
+        print "problem %3d seed %10d: score %6d -> %6d, time %7.2fs -> %7.2fs (%+.0f%%)" % (
+            r["problemId"], r["seed"], o["score"], r["score"], o["wall_time"], r["wall_time"],
+            100.0 * (r["wall_time"] - o["wall_time"]) / o["wall_time"] if o["wall_time"] > 0 else 0.0)
+
+def run():
+    parser = argparse.ArgumentParser(description='Measures solver throughput on the bundled problems.')
+    parser.add_argument('--solver', dest='solver', action='store', choices=sorted(SOLVERS), default='clever')
+    parser.add_argument('--problem', dest='problems', action='append', type=int,
+                        help='problem number in data/, all problems if not given')
+    parser.add_argument('--seed', dest='seeds', action='append', type=int,
+                        help='seed index, all seeds if not given')
+    parser.add_argument('--max-units', dest='max_units', action='store', type=int,
+                        help='stop every game after this many units')
+    parser.add_argument('--cores', dest='cores', action='store', type=int, default=1)
+    parser.add_argument('--output', dest='output', action='store', help='JSON file for the results')
+    parser.add_argument('--compare', dest='compare', action='store', help='earlier results to compare with')
+    parser.add_argument('-b', dest='board', action='store', choices=sorted(game.BOARDS), default='list')
+    solver = SOLVERS[parser.parse_known_args()[0].solver]()
+    solver.add_arguments(parser)
+    args = parser.parse_args()
+    solver.board = args.board
+    solver.use_arguments(args)
+
+    if args.problems:
+        files = [problem_file(p) for p in args.problems]
+    else:
+        files = sorted(glob.glob(os.path.join(DATA_DIR, 'problem_*.json')))
+    jobs = []
+    for f in files:
+        problem = game.Problem.load(f)
+        seed_indices = args.seeds if args.seeds else range(len(problem.source_seeds))
+        for seed_index in seed_indices:
+            if seed_index < len(problem.source_seeds):
+                jobs.append((solver, f, seed_index, args.max_units))
+
+    start = time.time()
+    pool = mp.Pool(args.cores, maxtasksperchild=1)
+    results = pool.map(run_job, jobs, chunksize=1)
+    pool.close()
+    pool.join()
+    report = {"solver": args.solver,
+              "options": dict((k, v) for k, v in vars(args).iteritems() if k not in ('output', 'compare')),
+              "wall_time": time.time() - start,
+              "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    else:
+        print json.dumps(report, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+_MISSING = object()
+
+class BoundedCache(object):
+    """
+    Dictionary cache holding at most max_size entries (None means unbounded).
+
+    Entries are kept in two generations. When the newest generation holds half of
+    max_size entries, the oldest generation is dropped. Entries found in the oldest
+    generation are moved to the newest, so recently used entries survive eviction,
+    which approximates LRU without any bookkeeping on hits.
+    """
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.current = {}
+        self.previous = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        value = self.current.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        value = self.previous.pop(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self[key] = value
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if self.max_size is not None and len(self.current) * 2 >= self.max_size:
+            self.evictions += len(self.previous)
+            self.previous = self.current
+            self.current = {}
+        self.current[key] = value
+
+    def __contains__(self, key):
+        return key in self.current or key in self.previous
+
+    def __len__(self):
+        return len(self.current) + len(self.previous)
+
+    def clear(self):
+        self.current = {}
+        self.previous = {}
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self),
+                'max_size': self.max_size,
+        }
+
+# Positions kept by a TranspositionTable
+TRANSPOSITION_SIZE = 200000
+
+class TranspositionTable(BoundedCache):
+    """
+    Bounded cache of the positions a search has already been through, keyed by
+    game.Game.state_key and a depth, so that a position reached again by another sequence
+    of moves or placements can be skipped or its value reused.
+    """
+    def __init__(self, max_size=TRANSPOSITION_SIZE):
+        BoundedCache.__init__(self, max_size)
+
+    @staticmethod
+    def key(g, depth=0):
+        return g.state_key() + (depth,)
+
+    def visit(self, g, depth=0):
+        """Records the position of g, returns False if it was recorded already."""
+        key = self.key(g, depth)
+        if self.get(key) is not None:
+            return False
+        self[key] = True
+        return True
@@ -1,19 +1,47 @@
 #!/usr/bin/env python
 
 import astar
+import cache
+import collections
 import copy
 import game
+import heapq
 import hx
 import itertools
 import math
 import operator
+import placement
+import random_solver
 import solver
+import time
+import timing
+
+try:
+    import numpy_scoring
+except ImportError:
+    numpy_scoring = None
+
+def changed_cells(old_rows, rows, width):
+    """
+    The cells (col, row) that differ between two results of Board.row_contents, rows of
+    cells or, for a BitBoard, rows of bits.
+    """
+    changed = []
+    for row, (old, new) in enumerate(itertools.izip(old_rows, rows)):
+        if old == new:
+            continue
+        if isinstance(new, (int, long)):
+            diff = old ^ new
+            changed.extend((col, row) for col in range(width) if diff >> col & 1)
+        else:
+            changed.extend((col, row) for col in range(width) if old[col] != new[col])
+    return changed
 
 def draw(g, unit, reachable=None):
     rows = []
     print "_"*g.board.width*2
     for row in range(g.board.height):
-        rows.append(['|*' if c else '| ' for c in g.board.cells[row]])
+        rows.append(['|*' if g.board.filled_cell(col, row) else '| ' for col in range(g.board.width)])
     if reachable:
         for r in reachable:
             col, row = r
@@ -32,14 +60,23 @@ def draw(g, unit, reachable=None):
 
 backwards_moves = [game.CMD_W, game.CMD_E, game.CMD_NE, game.CMD_NW, game.CMD_CW, game.CMD_CCW]
 
-def find_path(gameobj, goal):
+def find_path(gameobj, goal, stats=None, start=None, footprints=None, max_expansions=None, deadline=None):
+    """
+    Finds the moves from start, the current unit by default, to goal that don't pass any
+    of footprints, the footprints of the game by default. Returns None if there is no path,
+    or if none was found by the time deadline.
+    """
+    if start is None:
+        start = gameobj.unit
+    if footprints is None:
+        footprints = gameobj.footprints
+    footprints = footprints - set([start.footprint])
     def g(n1, n2):
         return 1
     def nf(g):
         def neighbours(u):
-            moves = gameobj.moves_unit_wu(u, backwards_moves, True)
-            ok_moves = moves[game.MOVE_OK]
-            return [new_u for d, new_u in ok_moves]
+            return [new_u for d, new_u in (gameobj.move_unit_result_wu(u, move, footprints) for move in backwards_moves)
+                    if d == game.MOVE_OK]
         return neighbours
     def hf(goal):
         def h(n):
@@ -48,32 +85,200 @@ def find_path(gameobj, goal):
             return hx.distance(hx.to_hex(gc, gr), hx.to_hex(nc, nr)) + goal.abs_rotation_distance(n)
         return h
     # Find backwards
-    f, p = astar.astar(goal, gameobj.unit, g, hf(gameobj.unit), nf(None))
+    f, p = astar.astar(goal, start, g, hf(start), nf(None), max_expansions=max_expansions, stats=stats,
+                       deadline=deadline)
+    if not p:
+        return None
     moves = [p[i].move_to_reach(p[i + 1], backwards_moves) for i in range(len(p) - 1)]
     moves = [game.OPPOSITE[m] for m in reversed(moves)]
     return moves
 
+def find_reachable(gameobj, deadline=None):
+    """
+    Flood fills all units that can be reached from the current unit of the game. Returns a
+    dict from every reachable unit to the (unit, move) it was first reached from, or None
+    for the current unit. Paths are shortest paths, so they never repeat a footprint.
+    Returns None if the fill is still running at the time deadline.
+    """
+    start = gameobj.unit
+    came_from = {start: None}
+    queue = collections.deque([start])
+    while queue:
+        if deadline is not None and len(came_from) % 256 == 0 and time.time() > deadline:
+            return None
+        unit = queue.popleft()
+        for move in game.MOVES:
+            r, new_unit = gameobj.move_unit_result_wu(unit, move, gameobj.footprints)
+            if r == game.MOVE_OK and new_unit not in came_from:
+                came_from[new_unit] = (unit, move)
+                queue.append(new_unit)
+    return came_from
+
+def reachable_path(came_from, goal):
+    moves = []
+    step = came_from[goal]
+    while step is not None:
+        unit, move = step
+        moves.append(move)
+        step = came_from[unit]
+    moves.reverse()
+    return moves
+
+# Most power phrases spelt out per unit, and the A* expansions allowed for the rest of
+# the path after each one
+PHRASES_PER_UNIT = 8
+PHRASE_PATH_EXPANSIONS = 2000
+
+PhraseMacro = collections.namedtuple('PhraseMacro', ['phrase', 'moves', 'rows', 'rotation'])
+
+def bottom_up(units):
+    """
+    The units lowest first. Ties are ordered by footprint, so the order doesn't depend on
+    how the set of units was built.
+    """
+    return sorted(units, key=lambda u: (u.north_border, u.footprint), reverse=True)
+
+def compile_phrases(phrases):
+    """
+    Turns power phrases into macro moves, with the number of rows each moves the unit down
+    and its net rotation. Phrases with characters that aren't commands are left out.
+    """
+    macros = []
+    for phrase in phrases:
+        p = phrase.lower()
+        if not p or any(c not in game.CHAR_CMDS for c in p):
+            continue
+        moves = tuple(game.CHAR_CMDS[c] for c in p)
+        rows = len([m for m in moves if m in (game.CMD_SW, game.CMD_SE)])
+        rotation = (moves.count(game.CMD_CW) - moves.count(game.CMD_CCW)) % 6
+        macros.append(PhraseMacro(p, moves, rows, rotation))
+    return macros
+
+def apply_macro(gameobj, unit, macro, footprints):
+    """
+    Plays the moves of a macro from unit. Returns the unit it ends at and the footprints
+    on the way, or None if a move would lock the unit or repeat a footprint.
+    """
+    visited = set()
+    for move in macro.moves:
+        r, unit = gameobj.move_unit_result_wu(unit, move, footprints)
+        if r != game.MOVE_OK or unit.footprint in visited:
+            return None
+        visited.add(unit.footprint)
+    return unit, visited
+
+def find_phrase_path(gameobj, goal, macros, uses, stats=None):
+    """
+    Finds moves to goal that spell out power phrases where possible. Phrases are tried
+    from the start of the path, those not used yet first, and one is taken if the goal
+    can still be reached after it. Units can't move up, so phrases that go further down
+    than the goal are skipped without playing them. Returns the moves and the phrases
+    spelt out, or None if the goal can't be reached.
+    """
+    unit = gameobj.unit
+    footprints = set(gameobj.footprints)
+    moves = []
+    spelt = []
+    tail = None
+    goal_row = goal.pivot[1]
+    # Unit rotations repeat after fewer than 6 steps, so the net rotation only breaks ties
+    ordered = sorted(macros, key=lambda m: (uses.get(m.phrase, 0) > 0, -len(m.moves), m.rotation != 0))
+    for _ in range(PHRASES_PER_UNIT):
+        for macro in ordered:
+            if unit.pivot[1] + macro.rows > goal_row:
+                continue
+            result = apply_macro(gameobj, unit, macro, footprints)
+            if result is None:
+                continue
+            end, visited = result
+            if goal.footprint in visited and end != goal:
+                continue
+            rest = find_path(gameobj, goal, stats, end, footprints | visited, PHRASE_PATH_EXPANSIONS)
+            if rest is None:
+                continue
+            moves.extend(macro.moves)
+            spelt.append(macro.phrase)
+            footprints |= visited
+            unit = end
+            tail = rest
+            break
+        else:
+            break
+    if tail is None:
+        tail = find_path(gameobj, goal, stats, unit, footprints, PHRASE_PATH_EXPANSIONS)
+        if tail is None:
+            return None
+    return moves + tail, spelt
+
+# Number of lock positions scored at a time, normally and when short of time
+BATCH_SIZE = 100
+CHEAP_BATCH_SIZE = 20
+
+# Lock positions tested between checks of the time left for the unit
+LOCKABLE_CHECKS_PER_TIME_CHECK = 1000
+
+# Weights of the parts of the score of a lock position
+WEIGHTS = {'filled': 10,
+           'avgheight': 1,
+           'height': 1,
+           'filledness': 1,
+           'evenness': 1,
+           'downness': 1,
+           'connectedness': 1,
+}
+
+# Placements kept at each level of the lookahead
+BEAM_WIDTH = 3
+
+SCORINGS = ['python'] + (['numpy'] if numpy_scoring is not None else [])
 
 class CleverSolver(solver.BaseSolver):
+    incremental = False
+    scoring = 'python'
+    reachability = False
+    batch_size = BATCH_SIZE
+    full_batch_size = BATCH_SIZE
+    weights = WEIGHTS
+    lookahead = 1
+    beam_width = BEAM_WIDTH
+
+    def add_arguments(self, parser):
+        parser.add_argument('-i', dest='incremental', action='store_true',
+                            help='only recompute lockable units in rows changed by the last lock')
+        parser.add_argument('-s', dest='scoring', action='store', choices=SCORINGS, default='python',
+                            help='scoring engine, numpy scores each batch of units as arrays')
+        parser.add_argument('-r', dest='reachability', action='store_true',
+                            help='only score lock positions reachable from the spawned unit')
+        parser.add_argument('-l', dest='lookahead', action='store', type=int, default=1,
+                            help='number of units placed in each search, the next units follow from the seed')
+        parser.add_argument('-w', dest='beam_width', action='store', type=int, default=BEAM_WIDTH,
+                            help='placements searched further at each lookahead level')
+
+    def use_arguments(self, args):
+        self.incremental = args.incremental
+        self.scoring = args.scoring
+        self.reachability = args.reachability
+        self.lookahead = args.lookahead
+        self.beam_width = args.beam_width
+
+    def portfolio(self, size):
+        """
+        This solver, a random restart, which costs next to nothing, variants of the weights,
+        the batch size and the lookahead, then more random restarts up to size.
+        """
+        variants = [self,
+                    self.variant(random_solver.RandomSolver),
+                    self.variant(weights=dict(WEIGHTS, filled=20)),
+                    self.variant(weights=dict(WEIGHTS, avgheight=3, height=3)),
+                    self.variant(full_batch_size=3 * BATCH_SIZE),
+                    self.variant(lookahead=2),
+        ]
+        for restart in range(1, size - len(variants) + 1):
+            variants.append(self.variant(random_solver.RandomSolver, restart=restart))
+        return variants[:size]
+
     def compute_possible(self, g, bw, bh):
-        if g.unit in self.computed_units:
-            processed = self.computed_units[g.unit]
-        else:
-            processed = set()
-            for s in range(6):
-                unit = g.unit.rotate(hx.TURN_CW, s)
-                for row in range(bh):
-                    for col in range(bw):
-                        new_unit = unit.to_position_nw((col, row))
-                        ok = True
-                        for x, y in new_unit.members:
-                            if x < 0 or x >= bw or y < 0 or y >= bh:
-                                ok = False
-                                break
-                        if not ok or new_unit in processed:
-                            continue
-                        processed.add(new_unit)
-            self.computed_units[g.unit] = processed
+        processed = self.placements.get(g.unit, self.check_time)
         if self.verbosity == 6:
             print "************************"
             print "num possible:", len(processed)
@@ -82,75 +287,89 @@ class CleverSolver(solver.BaseSolver):
                 print "************************"
         return processed
 
+    def is_lockable(self, g, unit):
+        return g.is_unit_valid(unit) and g.any_locking_move(unit)
+
     def compute_lockable(self, g, possible):
-        lockable = set()
-        for unit in possible:
-            if g.is_unit_valid(unit):
-                if g.any_locking_move(unit):
+        if self.incremental:
+            lockable = self.update_lockable(g, possible)
+        else:
+            lockable = set()
+            for i, unit in enumerate(possible):
+                if i % LOCKABLE_CHECKS_PER_TIME_CHECK == 0:
+                    self.check_time()
+                if self.is_lockable(g, unit):
                     lockable.add(unit)
         if self.verbosity > 0:
             print "lockables:", len(lockable)
         return lockable
 
+    def update_lockable(self, g, possible):
+        """
+        Incremental version of compute_lockable. Whether a unit is lockable only depends on
+        the cells covered by the unit and by the units it can move to, so only the units
+        touching cells that changed since the last time this unit was spawned are tested.
+        """
+        rows = g.board.row_contents()
+        try:
+            # Taken out while updating, running out of time leaves no half updated state
+            lockable, old_rows, by_cell = self.lockable_states.pop(g.unit)
+        except KeyError:
+            lockable = set()
+            by_cell = self.placements.touched_cells(g.unit, self.check_time)
+            for i, unit in enumerate(possible):
+                if i % LOCKABLE_CHECKS_PER_TIME_CHECK == 0:
+                    self.check_time()
+                if self.is_lockable(g, unit):
+                    lockable.add(unit)
+        else:
+            affected = set()
+            for cell in changed_cells(old_rows, rows, g.board.width):
+                affected.update(by_cell.get(cell, ()))
+            for i, unit in enumerate(affected):
+                if i % LOCKABLE_CHECKS_PER_TIME_CHECK == 0:
+                    self.check_time()
+                if self.is_lockable(g, unit):
+                    lockable.add(unit)
+                else:
+                    lockable.discard(unit)
+            if self.verbosity > 1:
+                print "affected:", len(affected)
+        self.lockable_states[g.unit] = (lockable, rows, by_cell)
+        return lockable
+
     def compute_scores(self, g, lockable, bw, bh):
+        if self.scoring == 'numpy':
+            return numpy_scoring.compute_scores(g.board, lockable, self.weights)
+        w = self.weights
         fbh = float(bh)
         fbw = float(bw)
         ftot = float(bw*bh)
         maxjaggedness = ftot / 2
         scores = {}
-        filled_cells = set()
-        gb = g.board
-        for row in range(gb.height):
-            for col in range(gb.width):
-                if gb.cells[row][col]:
-                    filled_cells.add((col, row))
+        board = g.board
+        # Everything about the board alone is computed once, each unit only adds a delta
+        ceiling = list(board.ceiling)
+        top = min(ceiling)
+        sum_height_before = sum(bh - c for c in ceiling)
+        holes_before = board.holes
+        elems_before = sum(board.row_fill)
+        full_before = sum(1 for n in board.row_fill if n == bw)
         for unit in lockable:
             if self.verbosity == 5:
                 draw(g, unit)
-            board = game.BoardWithUnit(g.board, unit)
-            filled = 0
-            for row in range(bh):
-                if board.filled_row(row):
-                    filled += 1
-            ceiling = board.ceiling
-            heights = [bh - ceiling[col] for col in range(bw)]
-            max_height = max(heights)
-            sum_height = float(sum(heights))
+            delta = board.placement_delta(unit.members)
+            filled = full_before + delta.full_rows
+            max_height = bh - min(top, delta.top)
+            sum_height = float(sum_height_before + delta.height)
             average_height = sum_height / fbw
+            # Was the sum of abs(heights[col] - heights[col]), always 0
             jaggedness = 0
-            for col in range(bw - 1):
-                jaggedness += abs(heights[col] - heights[col])
-            elems = 0
-            filled_cells_unit = set(filled_cells)
-            last_filled = False
-            changes_before = 0
-            for row in range(bh):
-                for col in range(bw):
-                    f = (col, row) in filled_cells_unit
-                    if f != last_filled:
-                        changes_before += 1
-                    last_filled = f
-            filled_cells_unit.update(set(unit.members))
-            holes = 0
-            for col in range(bw):
-                ceil = ceiling[col]
-                for row in range(bh):
-                    f = (col, row) in filled_cells_unit
-                    if f:
-                        elems += 1
-                    elif row >= ceil:
-                        holes += 1
-            last_filled = False
-            changes = 0
-            for row in range(bh):
-                for col in range(bw):
-                    f = (col, row) in filled_cells_unit
-                    if f != last_filled:
-                        changes += 1
-                    last_filled = f
+            holes = holes_before + delta.holes
+            elems = elems_before + len(unit.members)
             felems = float(elems)
             # We want to reduce changes
-            connectedness = (changes_before - changes)
+            connectedness = -delta.transitions
             filledness = (sum_height - holes) / felems
             evenness = (maxjaggedness - jaggedness) / maxjaggedness
 #                score = g.calc_unit_score(unit, filled)
@@ -158,7 +377,9 @@ class CleverSolver(solver.BaseSolver):
             heightscore = (bh - max_height) / fbh
             downness = sum([y for x, y in unit.members]) / (len(unit.members) * fbh)
 #            reachability = sum([1 for m in unit.members if m in self.reachable]) / float(len(unit.members))
-            total_score = 10 * filled + avghscore + heightscore + filledness + evenness + downness + connectedness #+ reachability
+            total_score = (w['filled'] * filled + w['avgheight'] * avghscore + w['height'] * heightscore +
+                           w['filledness'] * filledness + w['evenness'] * evenness + w['downness'] * downness +
+                           w['connectedness'] * connectedness) #+ reachability
             if self.verbosity > 3:
                 print "score:", total_score, "parts:", filled, avghscore, heightscore, filledness, evenness, downness, connectedness #, reachability
             scores[unit] = total_score
@@ -175,10 +396,17 @@ class CleverSolver(solver.BaseSolver):
                     print "skipping unreachable!"
                 continue
             # Calculate the path
-            moves = find_path(g, unit)
+            stats = {}
+            moves = find_path(g, unit, stats, deadline=self.unit_deadline)
+            self.timer.count('astar_runs')
+            self.timer.count('astar_expansions', stats['expansions'])
+            if not moves:
+                # Not unreachable if the search was cut short
+                self.check_time()
             if moves:
                 if self.verbosity > 1:
                     draw(g, unit)
+                moves = self.spell_phrases(g, unit, moves)
                 break
             else:
                 self.unreachable.add((g.unit, unit))
@@ -186,18 +414,242 @@ class CleverSolver(solver.BaseSolver):
                     draw(g, unit)
         return moves
 
+    def find_possible_moves(self, g, bw, bh):
+        timer = self.timer
+        # Compute possible units
+        with timer.phase('compute_possible'):
+            possible = self.compute_possible(g, bw, bh)
+        # Compute lockable units
+        with timer.phase('compute_lockable'):
+            lockable = self.compute_lockable(g, possible)
+        # Compute scores for all lockables, batch_size at a time
+        # Take from bottom up.
+        # Reachability is used when computing scores
+        # self.reachable = g.board.reachable_cells(g.unit.members[0], 1)
+        sorted_lockable = bottom_up(lockable)
+        batch_size = self.batch_size
+        for ix in range(0, len(sorted_lockable), batch_size):
+            with timer.phase('compute_scores'):
+                scores = self.compute_scores(g, sorted_lockable[ix:ix+batch_size], bw, bh)
+            # Go through them in order of best score
+            with timer.phase('find_moves'):
+                moves = self.find_moves(g, scores)
+            if moves:
+                return moves
+        return None
+
+    def find_lookahead_moves(self, g, bw, bh):
+        """
+        Finds the moves to the lock position that scores best together with the placements
+        of the next units. The unit sequence follows from the seed, so the next units are
+        the ones the game spawns after each placement. Only the beam_width best reachable
+        lock positions are searched further, and the placements further ahead are not
+        checked for reachability.
+        """
+        timer = self.timer
+        with timer.phase('compute_possible'):
+            possible = self.compute_possible(g, bw, bh)
+        with timer.phase('compute_lockable'):
+            lockable = self.compute_lockable(g, possible)
+        sorted_lockable = bottom_up(lockable)
+        with timer.phase('compute_scores'):
+            scores = self.compute_scores(g, sorted_lockable[:self.batch_size], bw, bh)
+        candidates = []
+        with timer.phase('find_moves'):
+            for unit, score in reversed(sorted(scores.iteritems(), key=operator.itemgetter(1))):
+                if len(candidates) == self.beam_width:
+                    break
+                if (g.unit, unit) in self.unreachable:
+                    continue
+                moves = find_path(g, unit, deadline=self.unit_deadline)
+                self.timer.count('astar_runs')
+                if not moves:
+                    self.check_time()
+                if moves:
+                    candidates.append((score, unit, moves))
+                else:
+                    self.unreachable.add((g.unit, unit))
+        if not candidates:
+            return self.find_possible_moves(g, bw, bh)
+        best = None
+        with timer.phase('lookahead'):
+            for score, unit, moves in candidates:
+                record = g.place_unit(unit)
+                try:
+                    value = self.weights['filled'] * g.ls_old + self.lookahead_value(g, self.lookahead - 1, bw, bh)
+                finally:
+                    g.undo_placement(record)
+                if best is None or value > best[0]:
+                    best = (value, unit, moves)
+        value, unit, moves = best
+        if self.verbosity > 1:
+            print "lookahead score:", value
+            draw(g, unit)
+        return self.spell_phrases(g, unit, moves)
+
+    def lookahead_value(self, g, depth, bw, bh):
+        """The best total score of placing the next depth units of the game."""
+        if depth <= 0 or g.unit is None:
+            return 0
+        # Placing the same units in another order can give the same position
+        key = self.transpositions.key(g, depth)
+        value = self.transpositions.get(key)
+        if value is not None:
+            self.timer.count('transpositions')
+            return value
+        value = self._lookahead_value(g, depth, bw, bh)
+        self.transpositions[key] = value
+        return value
+
+    def _lookahead_value(self, g, depth, bw, bh):
+        self.check_time()
+        self.timer.count('lookahead_nodes')
+        lockable = self.compute_lockable(g, self.compute_possible(g, bw, bh))
+        sorted_lockable = bottom_up(lockable)
+        scores = self.compute_scores(g, sorted_lockable[:self.batch_size], bw, bh)
+        if not scores:
+            return 0
+        if depth == 1:
+            return max(scores.itervalues())
+        best = None
+        for unit, score in heapq.nlargest(self.beam_width, scores.iteritems(), key=operator.itemgetter(1)):
+            record = g.place_unit(unit)
+            try:
+                value = self.weights['filled'] * g.ls_old + self.lookahead_value(g, depth - 1, bw, bh)
+            finally:
+                g.undo_placement(record)
+            best = value if best is None else max(best, value)
+        return best
+
+    def find_reachable_moves(self, g, bw, bh):
+        """
+        Finds the moves to the best lock position, scoring only the lock positions that
+        can be reached from the spawned unit. Returns None if there is none.
+        """
+        timer = self.timer
+        with timer.phase('find_reachable'):
+            came_from = find_reachable(g, self.unit_deadline)
+            if came_from is None:
+                self.check_time()
+            lockable = [unit for unit in came_from if g.any_locking_move(unit)]
+        if self.verbosity > 0:
+            print "reachable:", len(came_from), "lockables:", len(lockable)
+        if not lockable:
+            return None
+        sorted_lockable = bottom_up(lockable)
+        with timer.phase('compute_scores'):
+            scores = self.compute_scores(g, sorted_lockable[:self.batch_size], bw, bh)
+        unit, score = max(scores.iteritems(), key=operator.itemgetter(1))
+        if self.verbosity > 1:
+            print "score:", score
+            draw(g, unit)
+        return self.spell_phrases(g, unit, reachable_path(came_from, unit))
+
+    def spell_phrases(self, g, unit, moves):
+        """
+        Replaces the moves to unit with moves that spell out power phrases, when there are
+        phrases and the budget allows it. The phrases themselves are substituted into the
+        commands when the solution is written.
+        """
+        if not self.macros or self.budget != solver.BUDGET_FULL:
+            return moves
+        stats = {}
+        with self.timer.phase('find_phrase_path'):
+            result = find_phrase_path(g, unit, self.macros, self.phrase_uses, stats)
+        self.timer.count('astar_expansions', stats.get('expansions', 0))
+        if result is None:
+            return moves
+        phrase_moves, spelt = result
+        for phrase in spelt:
+            self.phrase_uses[phrase] = self.phrase_uses.get(phrase, 0) + 1
+        self.timer.count('phrases', len(spelt))
+        return phrase_moves
+
+    def find_greedy_moves(self, g):
+        """
+        Moves the unit sideways over the lowest columns as wide as the unit, then down until
+        it can't move further. The cheapest way to lock a unit that doesn't pile them all up
+        below the spawn position.
+        """
+        moves = []
+        unit = g.unit
+        footprints = set(g.footprints)
+        ceiling = list(g.board.ceiling)
+        size = unit.east_border - unit.west_border + 1
+        west = unit.west_border
+        target = max(range(len(ceiling) - size + 1),
+                     key=lambda col: (min(ceiling[col:col + size]), -abs(col - west)))
+        sideways = game.CMD_E if target > west else game.CMD_W
+        while unit.west_border != target:
+            r, new_unit = g.move_unit_result_wu(unit, sideways, footprints)
+            if r != game.MOVE_OK:
+                break
+            moves.append(sideways)
+            footprints.add(new_unit.footprint)
+            unit = new_unit
+        while True:
+            down = []
+            for move in (game.CMD_SW, game.CMD_SE):
+                r, new_unit = g.move_unit_result_wu(unit, move, footprints)
+                if r == game.MOVE_OK:
+                    down.append((abs(new_unit.west_border - target), move, new_unit))
+            if not down:
+                return moves
+            distance, move, unit = min(down)
+            moves.append(move)
+            footprints.add(unit.footprint)
+
+    def release_memory(self):
+        solver.BaseSolver.release_memory(self)
+        placement.clear_tables()
+        self.lockable_states = {}
+        self.unreachable = set()
+        self.transpositions = cache.TranspositionTable()
+
     def solve(self, g, verbosity):
         self.verbosity = verbosity
-        commands = []
+        commands = self.commands = []
+        bw, bh = g.size
+        self.lockable_states = {}
+        self.unreachable = set()
+        self.transpositions = cache.TranspositionTable()
+        self.macros = compile_phrases(self.phrases)
+        self.phrase_uses = {}
+        self.timer = timing.PhaseTimer()
+        with self.timer.phase('placement_table'):
+            self.placements = placement.get_table(bw, bh, g.units)
+        cache_stats = game.Unit.cache_stats()
+        self.start_budget()
+        self.place_units(g, bw, bh, commands)
+        for name, stats in game.Unit.cache_stats().iteritems():
+            self.timer.count(name + '_cache_hits', stats['hits'] - cache_stats[name]['hits'])
+            self.timer.count(name + '_cache_misses', stats['misses'] - cache_stats[name]['misses'])
+        if verbosity > 0:
+            print "Final score:", g.score
+            print self.timer.report()
+        return commands
+
+    def find_budget_moves(self, g, bw, bh, budget):
+        if budget == solver.BUDGET_GREEDY:
+            return self.find_greedy_moves(g)
+        elif budget == solver.BUDGET_CHEAP:
+            self.batch_size = CHEAP_BATCH_SIZE
+            return self.find_reachable_moves(g, bw, bh)
+        self.batch_size = self.full_batch_size
+        if self.lookahead > 1:
+            return self.find_lookahead_moves(g, bw, bh)
+        elif self.reachability:
+            return self.find_reachable_moves(g, bw, bh)
+        return self.find_possible_moves(g, bw, bh)
+
+    def place_units(self, g, bw, bh, commands):
+        verbosity = self.verbosity
         cmds = {game.CMD_E: 'b',
                 game.CMD_W: 'p',
                 game.CMD_SE: 'l',
                 game.CMD_SW: 'a',
                 game.CMD_CW: 'd',
                 game.CMD_CCW: 'k'}
-        bw, bh = g.size
-        self.computed_units = {}
-        self.unreachable = set()
         while True:
             if verbosity > 0:
                 print g.num_units, g.max_units
@@ -207,46 +659,39 @@ class CleverSolver(solver.BaseSolver):
             moves = []
             if g.unit is None:
                 break
-            # Compute possible units
-            possible = self.compute_possible(g, bw, bh)
-            # Compute lockable units
-            lockable = self.compute_lockable(g, possible)
-            # Compute scores for all lockables, 100 at a time
-            # Take from bottom up.
-            # Reachability is used when computing scores
-            # self.reachable = g.board.reachable_cells(g.unit.members[0], 1)
-            sorted_lockable = list(reversed(sorted(lockable, key=lambda x: x.north_border)))
-            moves = None
-            for ix in range(0, len(sorted_lockable), 100):
-                scores = self.compute_scores(g, sorted_lockable[ix:ix+100], bw, bh)
-                # Go through them in order of best score
-                moves = self.find_moves(g, scores)
-                if moves:
-                    break
+            budget = self.budget = self.budget_level(g.max_units - g.num_units + 1)
+            if budget == solver.BUDGET_STOP:
+                break
+            try:
+                moves = self.find_budget_moves(g, bw, bh, budget)
+            except solver.OutOfTime:
+                # Placing the unit the cheapest way keeps the commands so far
+                self.timer.count('out_of_time')
+                moves = self.find_greedy_moves(g)
+            self.timer.count('budget_' + solver.BUDGET_NAMES[budget])
             # Do the moves
-            if not moves:
+            if moves is None:
                 break
             if verbosity > 2:
                 print moves
-            for m in moves:
-                g.move_unit(m)
-                if g.ls_old > 0:
-                    self.unreachable = set()
-                if verbosity > 6:
-                    draw(g, None)
-                commands.append(cmds[m])
-            # lock unit if necessary
-            if g.unit:
-                lock_moves = g.moves()[game.MOVE_LOCK]
-                if lock_moves:
-                    m = lock_moves[0]
+            with self.timer.phase('moves'):
+                for m in moves:
                     g.move_unit(m)
                     if g.ls_old > 0:
                         self.unreachable = set()
+                    if verbosity > 6:
+                        draw(g, None)
                     commands.append(cmds[m])
-        if verbosity > 0:
-            print "Final score:", g.score
-        return commands
+                # lock unit if necessary
+                if g.unit:
+                    lock_moves = g.moves()[game.MOVE_LOCK]
+                    if lock_moves:
+                        m = lock_moves[0]
+                        g.move_unit(m)
+                        if g.ls_old > 0:
+                            self.unreachable = set()
+                        commands.append(cmds[m])
+            self.timer.count('units')
 
 if __name__ == '__main__':
     s = CleverSolver()
@@ -1,9 +1,14 @@
 #!/usr/bin/env python
 
+import cache
+import collections
 import copy
+import ctypes
 import hx
+import hxtable
 import json
 import math
+import shared
 
 CELL_EMPTY = ''
 CELL_FILLED = 'F'
@@ -52,6 +57,20 @@ MOVE = {CMD_W: hx.DIRECTION_W,
 
 MOVES = CMDS
 
+# The characters that encode each command in a solution
+CMD_CHARS = {CMD_W: "p'!.03",
+             CMD_E: 'bcefy2',
+             CMD_SW: 'aghij4',
+             CMD_SE: 'lmno 5',
+             CMD_CW: 'dqrvz1',
+             CMD_CCW: 'kstuwx',
+}
+
+CHAR_CMDS = dict((c, cmd) for cmd, chars in CMD_CHARS.iteritems() for c in chars)
+
+# Characters in a solution that are not commands
+IGNORED_CHARS = '\t\n\r'
+
 MOVE_OK = 0
 MOVE_LOCK = 1
 MOVE_ERROR = 2
@@ -70,12 +89,50 @@ class CircleCache(object):
 
 CIRCLES = CircleCache()
 
+ZOBRIST_MASK = (1 << 64) - 1
+
+def zobrist_key(col, row, salt=0):
+    """
+    Fixed pseudo random 64 bit key of a cell, its coordinates mixed like SplitMix64. The
+    salt gives independent keys for the same cell, e.g. for the pivot of a unit.
+    """
+    x = (((row & 0xffff) << 20) | ((col & 0xffff) << 4) | salt) * 0x9e3779b97f4a7c15 & ZOBRIST_MASK
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9 & ZOBRIST_MASK
+    x = (x ^ (x >> 27)) * 0x94d049bb133111eb & ZOBRIST_MASK
+    return x ^ (x >> 31)
+
+_zobrist_tables = {}
+
+def zobrist_table(width, height):
+    """The keys of the cells of a board, row by row."""
+    try:
+        return _zobrist_tables[(width, height)]
+    except KeyError:
+        table = [zobrist_key(col, row) for row in range(height) for col in range(width)]
+        _zobrist_tables[(width, height)] = table
+        return table
+
+# How locking cells would change the surface of a board, see Board.placement_delta
+PlacementDelta = collections.namedtuple('PlacementDelta', 'full_rows top height holes transitions')
+
 class Board(object):
+    """
+    Besides the cells, a board keeps the ceiling (the top filled row of each column), the
+    number of filled cells of each row and column and the number of filled/empty
+    transitions reading the cells row by row from an empty cell, up to date when cells are
+    locked and rows cleared. The holes of a column, the empty cells below its ceiling, follow
+    from these. The Zobrist hash of the filled cells, the xor of their keys, is kept too.
+    """
     def __init__(self, width, height, filled=None):
         self.width = width
         self.height = height
         self.cells = []
         self.ceiling = width * [height]
+        self.row_fill = height * [0]
+        self.col_fill = width * [0]
+        self.transitions = 0
+        self.zobrist_keys = zobrist_table(width, height)
+        self.zobrist = 0
         for row in range(height):
             self.cells.append(self.create_empty_row())
         if filled is not None:
@@ -83,9 +140,100 @@ class Board(object):
                 self._fill_cell(col, row)
 
     def _fill_cell(self, col, row):
+        self._count_cell(col, row, 1)
         self.cells[row][col] = True
         self.ceiling[col] = min(self.ceiling[col], row)
 
+    def _count_cell(self, col, row, change):
+        """Updates the counts for filling (change 1) or emptying (change -1) a cell."""
+        self.row_fill[row] += change
+        self.col_fill[col] += change
+        self.zobrist ^= self.zobrist_keys[row * self.width + col]
+        # Only the pairs with the previous and the next cell in reading order change
+        if col > 0:
+            before = self.filled_cell(col - 1, row)
+        else:
+            before = row > 0 and self.filled_cell(self.width - 1, row - 1)
+        delta = 1 - 2 * before
+        if col < self.width - 1:
+            delta += 1 - 2 * self.filled_cell(col + 1, row)
+        elif row < self.height - 1:
+            delta += 1 - 2 * self.filled_cell(0, row + 1)
+        self.transitions += change * delta
+
+    def column_holes(self, col):
+        return self.height - self.ceiling[col] - self.col_fill[col]
+
+    @property
+    def holes(self):
+        return sum(self.column_holes(col) for col in range(self.width))
+
+    def compute_zobrist(self):
+        """Hashes the filled cells from scratch, self.zobrist is kept up to date."""
+        keys = self.zobrist_keys
+        width = self.width
+        zobrist = 0
+        for col, row in self.filled_cells:
+            zobrist ^= keys[row * width + col]
+        return zobrist
+
+    def count_transitions(self):
+        """Counts the filled/empty transitions from scratch, self.transitions is kept up to date."""
+        transitions = 0
+        last = False
+        for row in range(self.height):
+            for col in range(self.width):
+                f = self.filled_cell(col, row)
+                if f != last:
+                    transitions += 1
+                last = f
+        return transitions
+
+    def placement_delta(self, cells):
+        """
+        Evaluates locking empty cells without changing the board, in time proportional to
+        the number of cells. Returns a PlacementDelta with the number of rows they fill, the
+        top row of the cells and how much the sum of the column heights, the number of holes
+        and the number of transitions change.
+        """
+        width = self.width
+        height = self.height
+        ceiling = self.ceiling
+        row_fill = self.row_fill
+        rows = {}
+        tops = {}
+        index = set()
+        for col, row in cells:
+            rows[row] = rows.get(row, 0) + 1
+            if row < tops.get(col, height):
+                tops[col] = row
+            index.add(row * width + col)
+        full_rows = 0
+        for row, count in rows.iteritems():
+            if row_fill[row] + count == width:
+                full_rows += 1
+        raised = 0
+        for col, top in tops.iteritems():
+            if top < ceiling[col]:
+                raised += ceiling[col] - top
+        # Pair i is the pair of cell i - 1 and cell i, with an empty cell before cell 0
+        last = width * height - 1
+        pairs = set(index)
+        pairs.update([i + 1 for i in index if i < last])
+        transitions = 0
+        for i in pairs:
+            if i > 0:
+                row, col = divmod(i - 1, width)
+                before = self.filled_cell(col, row)
+            else:
+                before = False
+            row, col = divmod(i, width)
+            after = self.filled_cell(col, row)
+            transitions += (((before or i - 1 in index) != (after or i in index)) -
+                            (before != after))
+        # A column holds (height - ceiling) cells of which the filled ones aren't holes
+        return PlacementDelta(full_rows, min(rows), raised, raised - len(index), transitions)
+
     def __str__(self):
         filled = []
         for row in range(self.height):
@@ -98,7 +246,7 @@ class Board(object):
         rows = []
         for row in range(self.height):
             padding = '' if row % 2 == 0 else ' '
-            rows.append(padding + ' '.join(['%d' % c for c in self.cells[row]]))
+            rows.append(padding + ' '.join(['%d' % self.filled_cell(col, row) for col in range(self.width)]))
         return '\n'.join(rows)
 
     @property
@@ -119,25 +267,78 @@ class Board(object):
         return all(self.cells[row])
 
     def clear_row(self, row):
-        for row in range(row, 0, -1):
-            self.cells[row] = self.cells[row - 1]
+        for r in range(row, 0, -1):
+            self.cells[r] = self.cells[r - 1]
         self.cells[0] = self.create_empty_row()
+        self._count_cleared_row(row)
+
+    def _count_cleared_row(self, row):
+        """Updates the ceiling and the counts once the rows above row moved down over it."""
+        row_fill = self.row_fill
+        row_fill[1:row + 1] = row_fill[0:row]
+        row_fill[0] = 0
         for col in range(self.width):
+            self.col_fill[col] -= 1
             # self.ceiling[col] can't be greater than row since the row should be
             # filled in order to be cleared.
             if self.ceiling[col] < row:
                 self.ceiling[col] += 1
             elif self.ceiling[col] == row:
                 self.ceiling[col] = self.height
-                for r in range(row, self.height):
+                if self.col_fill[col] == 0:
+                    continue
+                for r in range(row + 1, self.height):
                     if self.filled_cell(col, r):
                         self.ceiling[col] = r
+                        break
+        self.transitions = self.count_transitions()
+        # Every cell above the row moved, so nothing is left of the old hash
+        self.zobrist = self.compute_zobrist()
+
+    def _count_restored_row(self, row):
+        """Updates the counts once a cleared row is put back, the ceiling is restored separately."""
+        row_fill = self.row_fill
+        row_fill[0:row] = row_fill[1:row + 1]
+        row_fill[row] = self.width
+        for col in range(self.width):
+            self.col_fill[col] += 1
+        self.transitions = self.count_transitions()
+        self.zobrist = self.compute_zobrist()
 
     def lock(self, cells):
         for c in cells:
             col, row = c
             self._fill_cell(col, row)
 
+    def row_contents(self):
+        """Returns an immutable copy of every row that can be compared with an earlier copy."""
+        return [tuple(r) for r in self.cells]
+
+    def unlock(self, cells, cleared_rows, ceiling):
+        """
+        Reverts a lock of cells followed by clearing of cleared_rows, restoring the
+        ceiling from before the lock.
+        """
+        for row in reversed(cleared_rows):
+            del self.cells[0]
+            self.cells.insert(row, self.create_full_row())
+            self._count_restored_row(row)
+        for col, row in cells:
+            self._clear_cell(col, row)
+        self.ceiling = list(ceiling)
+
+    def _clear_cell(self, col, row):
+        self.cells[row][col] = False
+        self._count_cell(col, row, -1)
+
+    def unit_fits(self, unit):
+        w = self.width
+        h = self.height
+        for col, row in unit.members:
+            if not (0 <= col < w and 0 <= row < h) or self.filled_cell(col, row):
+                return False
+        return True
+
     def position(self, origin, direction):
         """
         Calculates a new position given a current position and the direction of movement.
@@ -151,6 +352,9 @@ class Board(object):
     def create_empty_row(self):
         return self.width * [False]
 
+    def create_full_row(self):
+        return self.width * [True]
+
     def close_to_cell(self, cell, distance):
         cells = [cell]
         for radius in range(1, distance + 1):
@@ -189,75 +393,322 @@ class Board(object):
                 q.append(n)
         return reached
 
-class BoardWithUnit(object):
-    def __init__(self, board, unit):
-        self.board = board
-        self.unit = unit
+class BitBoard(Board):
+    """
+    Board storing each row as an integer bitmask, bit n set meaning column n is filled.
+    """
+    def __init__(self, width, height, filled=None):
+        self.full_row = (1 << width) - 1
+        Board.__init__(self, width, height, filled)
+
+    def _fill_cell(self, col, row):
+        self._count_cell(col, row, 1)
+        self.cells[row] |= 1 << col
+        self.ceiling[col] = min(self.ceiling[col], row)
+
+    @property
+    def filled_cells(self):
+        for row in range(self.height):
+            mask = self.cells[row]
+            col = 0
+            while mask:
+                if mask & 1:
+                    yield (col, row)
+                mask >>= 1
+                col += 1
+
+    def _clear_cell(self, col, row):
+        self.cells[row] &= ~(1 << col)
+        self._count_cell(col, row, -1)
 
     def filled_cell(self, col, row):
-        if self.board.filled_cell(col, row):
-            return True
-        return (col, row) in self.unit.members
+        return (self.cells[row] >> col) & 1 == 1
 
     def filled_row(self, row):
-        for col in range(self.board.width):
-            if not self.filled_cell(col, row):
+        return self.cells[row] == self.full_row
+
+    def clear_row(self, row):
+        cells = self.cells
+        del cells[row]
+        cells.insert(0, self.create_empty_row())
+        self._count_cleared_row(row)
+
+    def count_transitions(self):
+        inner = (1 << (self.width - 1)) - 1
+        last_bit = self.width - 1
+        transitions = 0
+        last = 0
+        for mask in self.cells:
+            # Within the row, then between the last cell of the previous row and the first
+            transitions += bin((mask ^ (mask >> 1)) & inner).count('1') + ((mask & 1) != last)
+            last = (mask >> last_bit) & 1
+        return transitions
+
+    def row_contents(self):
+        return list(self.cells)
+
+    def unit_fits(self, unit):
+        cells = self.cells
+        h = self.height
+        full_row = self.full_row
+        masks = unit.row_masks
+        if masks is None:
+            return False
+        for row, mask in masks:
+            if not 0 <= row < h or mask > full_row or cells[row] & mask:
                 return False
         return True
 
+    def create_empty_row(self):
+        return 0
+
+    def create_full_row(self):
+        return self.full_row
+
+WORD_BITS = 64
+WORD_MASK = (1 << WORD_BITS) - 1
+
+class SharedRows(object):
+    """
+    Rows of a SharedBoard wider than a word, each stored as several 64 bit words of an
+    array, lowest columns first, and read and written as one int like the rows of a BitBoard.
+    """
+    def __init__(self, words, row_words):
+        self.words = words
+        self.row_words = row_words
+        self.length = len(words) // row_words
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for row in range(self.length):
+            yield self.get_row(row)
+
+    def get_row(self, row):
+        n = self.row_words
+        mask = 0
+        for word in reversed(self.words[row * n:(row + 1) * n]):
+            mask = (mask << WORD_BITS) | word
+        return mask
+
+    def set_row(self, row, mask):
+        n = self.row_words
+        self.words[row * n:(row + 1) * n] = [(mask >> (WORD_BITS * i)) & WORD_MASK for i in range(n)]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.get_row(row) for row in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return self.get_row(index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            rows = range(*index.indices(self.length))
+            value = list(value)
+            if len(value) != len(rows):
+                raise ValueError('Can only assign as many rows as the slice holds')
+            for row, mask in zip(rows, value):
+                self.set_row(row, mask)
+        else:
+            self.set_row(index, value)
+
+class SharedBoard(BitBoard):
+    """
+    BitBoard with the rows, the ceiling and the counts in a shared.SharedBuffer, so that
+    other processes can attach to the board by name and see every change to it without copying.
+    Pickling a SharedBoard only pickles its name. Rows up to 64 columns wide are single
+    words, wider rows take several words and are slower to access.
+    """
+    def __init__(self, width, height, filled=None, name=None):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1
+        row_words = (width + WORD_BITS - 1) // WORD_BITS
+        cell_words = row_words * height
+        self.buffer = shared.SharedBuffer(8 * (cell_words + height + 2 * width + 2), name)
+        words = (ctypes.c_uint64 * cell_words).from_buffer(self.buffer.map)
+        self.cells = words if row_words == 1 else SharedRows(words, row_words)
+        offset = 8 * cell_words
+        self.ceiling = (ctypes.c_uint64 * width).from_buffer(self.buffer.map, offset)
+        offset += 8 * width
+        self.row_fill = (ctypes.c_uint64 * height).from_buffer(self.buffer.map, offset)
+        offset += 8 * height
+        self.col_fill = (ctypes.c_uint64 * width).from_buffer(self.buffer.map, offset)
+        offset += 8 * width
+        self.counts = (ctypes.c_uint64 * 2).from_buffer(self.buffer.map, offset)
+        self.zobrist_keys = zobrist_table(width, height)
+        if name is None:
+            self.ceiling[:] = width * [height]
+            if filled is not None:
+                for col, row in filled:
+                    self._fill_cell(col, row)
+
     @property
-    def ceiling(self):
-        w = self.board.width
-        unit_ceiling = w * [self.board.height]
-        for col, row in self.unit.members:
-            unit_ceiling[col] = min(unit_ceiling[col], row)
-        return [min(unit_ceiling[col], self.board.ceiling[col]) for col in range(w)]
+    def transitions(self):
+        return self.counts[0]
+
+    @transitions.setter
+    def transitions(self, value):
+        self.counts[0] = value
+
+    @property
+    def zobrist(self):
+        return self.counts[1]
+
+    @zobrist.setter
+    def zobrist(self, value):
+        self.counts[1] = value
+
+    def __reduce__(self):
+        return (attach_board, (self.buffer.name, self.width, self.height))
+
+    def __deepcopy__(self, memo):
+        # A copy gets its own memory, unlike a board attached by name
+        return SharedBoard(self.width, self.height, list(self.filled_cells))
+
+    def clear_row(self, row):
+        cells = self.cells
+        cells[1:row + 1] = cells[0:row]
+        cells[0] = 0
+        self._count_cleared_row(row)
+
+    def unlock(self, cells, cleared_rows, ceiling):
+        rows = self.cells
+        for row in reversed(cleared_rows):
+            rows[0:row] = rows[1:row + 1]
+            rows[row] = self.full_row
+            self._count_restored_row(row)
+        for col, row in cells:
+            self._clear_cell(col, row)
+        self.ceiling[:] = ceiling
+
+def attach_board(name, width, height):
+    """Attaches to the memory of the SharedBoard with the given name."""
+    return SharedBoard(width, height, name=name)
+
+UNIT_CACHE_SIZE = 500000
+ACTION_CACHE_SIZE = 2000000
+
+# Footprints pack every cell into a fixed width field, with the coordinates biased so that
+# cells outside the board are positive too.
+FOOTPRINT_BIAS = 1 << 15
+FOOTPRINT_BITS = 32
 
 class Unit(object):
-    unit_cache = {}
-    action_cache = {}
+    __slots__ = ['pivot', 'members', 'footprint', 'hash', '_row_masks', '_zobrist']
+
+    unit_cache = cache.BoundedCache(UNIT_CACHE_SIZE)
+    action_cache = cache.BoundedCache(ACTION_CACHE_SIZE)
+    cache_scope = None
+    table = None
+
+    @staticmethod
+    def use_cache_scope(scope):
+        """
+        Clears the unit and action caches if they were filled for another scope, e.g. a
+        different problem, so that long running workers don't keep units of old problems.
+        """
+        if scope != Unit.cache_scope:
+            Unit.unit_cache.clear()
+            Unit.action_cache.clear()
+            Unit.cache_scope = scope
+
+    @staticmethod
+    def cache_stats():
+        return {'units': Unit.unit_cache.stats(),
+                'actions': Unit.action_cache.stats(),
+        }
+
+    @staticmethod
+    def use_table(table):
+        """Use the lookup tables of a board for moves and rotations, or None to compute them."""
+        Unit.table = table
 
     @staticmethod
     def make_footprint(pivot, members):
-        return tuple(sorted(members) + [pivot])
+        """
+        Encodes the pivot followed by the sorted members as a single int, so that footprint
+        sets and cache keys hash and compare a number instead of a tuple of tuples.
+        """
+        bias = FOOTPRINT_BIAS
+        col, row = pivot
+        footprint = ((row + bias) << 16) | (col + bias)
+        for code in sorted([((row + bias) << 16) | (col + bias) for col, row in members]):
+            footprint = (footprint << FOOTPRINT_BITS) | code
+        return footprint
 
     @staticmethod
     def get_or_create_unit(pivot, members):
         footprint = Unit.make_footprint(pivot, members)
-        try:
-            return Unit.unit_cache[footprint]
-        except KeyError:
-            pass
+        unit = Unit.unit_cache.get(footprint)
+        if unit is not None:
+            return unit
         unit = Unit(pivot, members, footprint)
         Unit.unit_cache[footprint] = unit
         return unit
 
     def __init__(self, pivot, members, footprint):
         self.pivot = pivot
-        self.members = members
+        self.members = tuple(members)
         self.footprint = footprint
-        self.hash = None
+        self.hash = hash(footprint)
+        self._row_masks = False
+        self._zobrist = None
 
     def __contains__(self, cell):
         return cell in self.members
 
-    # def __eq__(self, other):
-    #     return id(self) == id(other)
+    # Units are interned, but the caches are bounded so equal units can exist as different
+    # objects after an eviction.
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Unit) and self.footprint == other.footprint)
 
-    # def __ne__(self, other):
-    #     return not self.__eq__(other)
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
-    # def __hash__(self):
-    #     if self.hash is None:
-    #         self.hash = hash(self.footprint)
-    #     return self.hash
+    def __hash__(self):
+        return self.hash
 
     def __str__(self):
         return "(%s, %s)"%(self.pivot, self.members)
 
+    @property
+    def row_masks(self):
+        """
+        The members as a tuple of (row, column bitmask) pairs, or None if any member has a
+        negative column and so can't be represented as a mask.
+        """
+        if self._row_masks is False:
+            masks = {}
+            for col, row in self.members:
+                if col < 0:
+                    masks = None
+                    break
+                masks[row] = masks.get(row, 0) | (1 << col)
+            self._row_masks = tuple(sorted(masks.items())) if masks is not None else None
+        return self._row_masks
+
+    @property
+    def zobrist(self):
+        """
+        Zobrist hash of the placement, the keys of the members and a separate key of the
+        pivot, so it can be combined with the hash of a board.
+        """
+        if self._zobrist is None:
+            col, row = self.pivot
+            zobrist = zobrist_key(col, row, 1)
+            for col, row in self.members:
+                zobrist ^= zobrist_key(col, row, 2)
+            self._zobrist = zobrist
+        return self._zobrist
+
     def to_position(self, cell, rotation=0):
         vector = hx.offset_vector(self.pivot, cell)
-        members = [hx.offset_translate(member, vector) for member in self.members]
+        members = hx.offset_translate_list(self.members, vector)
         unit = Unit.get_or_create_unit(cell, members)
         if rotation > 0:
             unit = unit.rotate(hx.TURN_CW, rotation)
@@ -268,7 +719,7 @@ class Unit(object):
     def to_position_nw(self, cell, rotation=0):
         vector = hx.offset_vector(self.nw_corner, cell)
         pivot = hx.offset_translate(self.pivot, vector)
-        members = [hx.offset_translate(member, vector) for member in self.members]
+        members = hx.offset_translate_list(self.members, vector)
         unit = Unit.get_or_create_unit(pivot, members)
         if rotation > 0:
             unit = unit.rotate(hx.TURN_CW, rotation)
@@ -290,26 +741,30 @@ class Unit(object):
         return unit.to_position((spawn_col, row))
 
     def move(self, direction):
+        if Unit.table is not None:
+            cells = Unit.table.move_list((self.pivot,) + self.members, direction)
+            return Unit.get_or_create_unit(cells[0], cells[1:])
         pivot = hx.offset_move(self.pivot, direction)
         members = [hx.offset_move(member, direction) for member in self.members]
         return Unit.get_or_create_unit(pivot, members)
 
     def rotate(self, direction, steps=1):
         members = self.members
+        rotate_list = Unit.table.rotate_list if Unit.table is not None else hx.offset_rotate_list
         for step in range(steps):
-            members = hx.offset_rotate_list(self.pivot, members, direction)
+            members = rotate_list(self.pivot, members, direction)
         return Unit.get_or_create_unit(self.pivot, members)
 
     def action(self, cmd):
-        try:
-            return Unit.action_cache[(self, cmd)]
-        except KeyError:
-            pass
+        key = (self.footprint << 3) | cmd
+        unit = Unit.action_cache.get(key)
+        if unit is not None:
+            return unit
         if cmd < CMD_CW:
             unit = self.move(MOVE[cmd])
         else:
             unit = self.rotate(TURN[cmd])
-        Unit.action_cache[(self, cmd)] = unit
+        Unit.action_cache[key] = unit
         return unit
 
     def move_to_reach(self, other, moves):
@@ -356,15 +811,17 @@ class Unit(object):
     #         touched.update(set(unit.members))
     #     return Unit.get_or_create_unit(self.pivot, list(touched))
 
-def lcg(seed):
+def lcg_next(seed):
     modulus = 2**32
     multiplier = 1103515245
     increment = 12345
+    return (multiplier * seed + increment) % modulus
+
+def lcg(seed):
     curr = seed
     while True:
-        new = (multiplier * curr + increment) % modulus
         yield ((curr >> 16) & 0x7fff, curr)
-        curr = new
+        curr = lcg_next(curr)
 
 class Game(object):
     def __init__(self, board, units, max_units, seed, unit=None):
@@ -373,6 +830,7 @@ class Game(object):
         self.max_units = max_units
         self.num_units = 0
         self.curr_seed = seed
+        self.rnd_seed = seed
         self.rnd = lcg(seed)
         self.ls_old = 0
         self.score = 0
@@ -385,7 +843,8 @@ class Game(object):
         board = copy.deepcopy(self.board)
         units = copy.deepcopy(self.units)
         unit = copy.deepcopy(self.unit)
-        game = Game(board, units, self.max_units - self.num_units, self.curr_seed, unit=unit)
+        game = Game(board, units, self.max_units - self.num_units, self.rnd_seed, unit=unit)
+        game.curr_seed = self.curr_seed
         game.footprints = copy.deepcopy(self.footprints)
         game.score = self.score
         game.ls_old = self.ls_old
@@ -396,6 +855,7 @@ class Game(object):
             self.unit = None
             return
         rand, self.curr_seed = self.rnd.next()
+        self.rnd_seed = lcg_next(self.curr_seed)
         self.curr_unit = rand % len(self.units)
         unit = self.units[self.curr_unit].to_spawn(self.board.width)
         if self.is_unit_valid(unit):
@@ -406,7 +866,19 @@ class Game(object):
             self.unit = None
 
     def is_unit_valid(self, unit):
-        return all((self.is_valid_pos(p) for p in unit.members))
+        return self.board.unit_fits(unit)
+
+    def state_key(self):
+        """
+        Identifies the position for transposition tables: the hash of the board and the
+        current unit, the number of units spawned and the state of the random generator,
+        which fixes the units to come. The footprints visited by the current unit are left
+        out, so positions reached along different paths are the same.
+        """
+        zobrist = self.board.zobrist
+        if self.unit is not None:
+            zobrist ^= self.unit.zobrist
+        return (zobrist, self.num_units, self.rnd_seed)
 
     def cell(self, col, row):
         if self.unit is not None:
@@ -483,18 +955,90 @@ class Game(object):
             self.unit = unit
             self.footprints.add(unit.footprint)
         else:
-            self.board.lock(self.unit.members)
-            ls = 0
-            row = self.board.height - 1
-            while row > 0:
-                if self.board.filled_row(row):
-                    ls += 1
-                    self.board.clear_row(row)
-                else:
-                    row -= 1
-            self.score = self.score + self.calc_unit_score(self.unit, ls)
-            self.ls_old = ls
-            self.next_unit()
+            self.lock_unit()
+
+    def lock_unit(self):
+        """
+        Locks the current unit, clears filled rows and spawns the next unit.
+        Returns the cleared rows in the order they were cleared.
+        """
+        self.board.lock(self.unit.members)
+        cleared = []
+        row = self.board.height - 1
+        while row > 0:
+            if self.board.filled_row(row):
+                cleared.append(row)
+                self.board.clear_row(row)
+            else:
+                row -= 1
+        ls = len(cleared)
+        self.score = self.score + self.calc_unit_score(self.unit, ls)
+        self.ls_old = ls
+        self.next_unit()
+        return cleared
+
+    def apply_move(self, direction):
+        """
+        Does the same as move_unit, but returns a record that can be passed to undo_move to
+        restore the game to the state before the move. Only the cells of a locked unit and
+        the cleared rows are recorded, so this is much cheaper than clone for searching.
+        """
+        if self.unit is None:
+            return None
+        unit = self.unit.action(direction)
+        if unit.footprint in self.footprints:
+            raise ValueError('Illegal move: %d'%direction)
+        if self.is_unit_valid(unit):
+            record = (self.unit, None)
+            self.unit = unit
+            self.footprints.add(unit.footprint)
+            return record
+        state = self._lock_state()
+        unit = self.unit
+        cleared = self.lock_unit()
+        return (unit, (state, cleared))
+
+    def _lock_state(self):
+        return (self.footprints, self.num_units, self.curr_seed, self.rnd_seed,
+                getattr(self, 'curr_unit', None), self.score, self.ls_old, list(self.board.ceiling))
+
+    def place_unit(self, unit):
+        """
+        Locks unit in place of the current unit, as if the current unit had been moved there,
+        and spawns the next unit. For searching ahead, returns a record that can be passed
+        to undo_placement.
+        """
+        state = self._lock_state()
+        current = self.unit
+        self.unit = unit
+        cleared = self.lock_unit()
+        return (current, (unit, (state, cleared)))
+
+    def undo_placement(self, record):
+        current, locked = record
+        self.undo_move(locked)
+        self.unit = current
+
+    def undo_move(self, record):
+        """Undoes a move made with apply_move. Moves must be undone in reverse order."""
+        if record is None:
+            return
+        unit, locked = record
+        if locked is None:
+            self.footprints.discard(self.unit.footprint)
+        else:
+            state, cleared = locked
+            footprints, num_units, curr_seed, rnd_seed, curr_unit, score, ls_old, ceiling = state
+            self.board.unlock(unit.members, cleared, ceiling)
+            self.footprints = footprints
+            self.num_units = num_units
+            self.curr_seed = curr_seed
+            self.rnd_seed = rnd_seed
+            self.rnd = lcg(rnd_seed)
+            self.curr_unit = curr_unit
+            self.score = score
+            self.ls_old = ls_old
+        self.unit = unit
 
     def calc_unit_score(self, unit, cleared_lines):
         points = len(unit.members) + 100 * (1 + cleared_lines) * cleared_lines / 2
@@ -503,6 +1047,11 @@ class Game(object):
             line_bonus = math.floor((self.ls_old - 1) * points / 10)
         return points + line_bonus
 
+BOARDS = {'list': Board,
+          'bit': BitBoard,
+          'shared': SharedBoard,
+}
+
 def jc2t(coord):
     """Convert a json coordinate to a (x, y) tuple."""
     return (coord["x"], coord["y"])
@@ -517,8 +1066,20 @@ class Problem(object):
         self.units = [Unit.get_or_create_unit(jc2t(u["pivot"]), [jc2t(m) for m in u["members"]]) for u in problem["units"]]
         self.filled = [jc2t(f) for f in problem["filled"]]
 
-    def make_game(self, seed_index):
-        return Game(Board(self.width, self.height, self.filled), self.units, self.source_length, self.source_seeds[seed_index])
+    @property
+    def table_margin(self):
+        """Margin around the board that units can reach while being positioned and rotated."""
+        extent = 0
+        for unit in self.units:
+            for member in unit.members:
+                extent = max(extent, hx.offset_distance(unit.pivot, member))
+        return 2 * extent + 2
+
+    def make_game(self, seed_index, board_class=Board):
+        Unit.use_cache_scope(self.id)
+        Unit.use_table(hxtable.get_table(self.width, self.height, self.table_margin))
+        board = board_class(self.width, self.height, self.filled)
+        return Game(board, self.units, self.source_length, self.source_seeds[seed_index])
 
     @staticmethod
     def load(filename):
@@ -132,6 +132,15 @@ def offset_translate(origin, vector):
     h = to_hex(*origin)
     return to_offset(hex_add(h, vector))
 
+def offset_translate_list(cells, vector):
+    """
+    Translates all cells by a hex vector without converting each cell to cube coordinates.
+    The column shift only depends on whether the cell is on an even or an odd row.
+    """
+    vx, vz = vector.x, vector.z
+    shift = (vx + (vz - vz % 2) / 2, vx + (vz + 1 - (vz + 1) % 2) / 2)
+    return [(col + shift[row % 2], row + vz) for col, row in cells]
+
 def offset_vector(c0, c1):
     h0 = to_hex(*c0)
     h1 = to_hex(*c1)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import hx
+
+class HexTable(object):
+    """
+    Precomputed move and rotation lookups for the cells of a board, extended by a margin on
+    every side so that units partially outside the board can be handled too. Cells are
+    numbered row by row, and lookups that leave the table fall back to the hx functions.
+    """
+    def __init__(self, width, height, margin):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.cells = []
+        self.index = {}
+        for row in range(-margin, height + margin):
+            for col in range(-margin, width + margin):
+                self.index[(col, row)] = len(self.cells)
+                self.cells.append((col, row))
+        self.neighbours = {}
+        for direction in hx.DIRECTIONS:
+            self.neighbours[direction] = [self.index.get(hx.offset_move(c, direction)) for c in self.cells]
+        # Filled lazily, pivot index -> {cell index: rotated cell index}
+        self.rotations = {hx.TURN_CW: {},
+                          hx.TURN_CCW: {},
+        }
+
+    def move_list(self, cells, direction):
+        index = self.index
+        neighbours = self.neighbours[direction]
+        table_cells = self.cells
+        try:
+            return [table_cells[neighbours[index[c]]] for c in cells]
+        except (KeyError, TypeError):
+            return [hx.offset_move(c, direction) for c in cells]
+
+    def rotate_list(self, pivot, cells, direction):
+        index = self.index
+        table_cells = self.cells
+        try:
+            pivot_index = index[pivot]
+            cell_indices = [index[c] for c in cells]
+        except KeyError:
+            return hx.offset_rotate_list(pivot, cells, direction)
+        try:
+            rotated = self.rotations[direction][pivot_index]
+        except KeyError:
+            rotated = {}
+            self.rotations[direction][pivot_index] = rotated
+        result = []
+        for ci in cell_indices:
+            try:
+                ri = rotated[ci]
+            except KeyError:
+                ri = index.get(hx.offset_rotate(pivot, table_cells[ci], direction))
+                rotated[ci] = ri
+            if ri is None:
+                return hx.offset_rotate_list(pivot, cells, direction)
+            result.append(table_cells[ri])
+        return result
+
+_tables = {}
+
+def get_table(width, height, margin):
+    key = (width, height, margin)
+    try:
+        return _tables[key]
+    except KeyError:
+        table = HexTable(width, height, margin)
+        _tables[key] = table
+        return table
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+def board_grid(board):
+    grid = np.zeros((board.height, board.width), dtype=bool)
+    for col, row in board.filled_cells:
+        grid[row, col] = True
+    return grid
+
+def count_changes(flat):
+    """Number of filled/empty changes along the last axis, starting from empty."""
+    return flat[..., 0].astype(int) + (flat[..., 1:] != flat[..., :-1]).sum(axis=-1)
+
+def compute_scores(board, units, weights):
+    """
+    Computes the same scores as CleverSolver.compute_scores with the weights of its parts,
+    for all units at once. The board with each unit placed on it is stacked into one array
+    of shape (units, height, width), so every score component is computed in a single pass.
+    """
+    units = list(units)
+    if not units:
+        return {}
+    bw = board.width
+    bh = board.height
+    fbh = float(bh)
+    fbw = float(bw)
+    n = len(units)
+    grid = board_grid(board)
+    changes_before = count_changes(grid.reshape(-1))
+    sizes = np.array([len(u.members) for u in units])
+    index = np.repeat(np.arange(n), sizes)
+    cols = np.array([col for u in units for col, row in u.members])
+    rows = np.array([row for u in units for col, row in u.members])
+    unit_grid = np.zeros((n, bh, bw), dtype=bool)
+    unit_grid[index, rows, cols] = True
+    stacked = unit_grid | grid[np.newaxis]
+    # Filled rows
+    filled = stacked.all(axis=2).sum(axis=1)
+    # Heights
+    unit_ceiling = np.where(unit_grid.any(axis=1), unit_grid.argmax(axis=1), bh)
+    ceiling = np.minimum(unit_ceiling, np.array(board.ceiling)[np.newaxis])
+    heights = bh - ceiling
+    max_height = heights.max(axis=1)
+    sum_height = heights.sum(axis=1).astype(float)
+    average_height = sum_height / fbw
+    # Holes are empty cells at or below the ceiling
+    below = np.arange(bh)[np.newaxis, :, np.newaxis] >= ceiling[:, np.newaxis, :]
+    holes = (below & ~stacked).sum(axis=(1, 2))
+    elems = stacked.sum(axis=(1, 2)).astype(float)
+    changes = count_changes(stacked.reshape(n, -1))
+    connectedness = changes_before - changes
+    filledness = (sum_height - holes) / elems
+    # Jaggedness is always 0 in compute_scores
+    evenness = 1.0
+    avghscore = (bh - average_height) / fbh
+    heightscore = (bh - max_height) / fbh
+    downness = np.bincount(index, weights=rows, minlength=n) / (sizes * fbh)
+    w = weights
+    total_score = (w['filled'] * filled + w['avgheight'] * avghscore + w['height'] * heightscore +
+                   w['filledness'] * filledness + w['evenness'] * evenness + w['downness'] * downness +
+                   w['connectedness'] * connectedness)
+    return dict(zip(units, total_score.tolist()))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import game
+import hx
+
+class PlacementTable(object):
+    """
+    All placements inside the board of the units of a problem, in every rotation and
+    position, keyed by the spawned unit. They only depend on the units and the size of the
+    board, so one table is shared by all seeds of a problem solved in a process. The
+    placements of a unit are computed when it is first spawned. Computing them calls
+    check_time, if given, every row, so that an anytime solver can cut them short. Nothing
+    is kept then.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.placements = {}
+        # Spawned unit -> {cell: placements covering the cell or a cell they can move to}
+        self.cells = {}
+
+    def compute(self, spawned, check_time=None):
+        bw = self.width
+        bh = self.height
+        placements = set()
+        for s in range(6):
+            unit = spawned.rotate(hx.TURN_CW, s)
+            for row in range(bh):
+                if check_time is not None:
+                    check_time()
+                for col in range(bw):
+                    new_unit = unit.to_position_nw((col, row))
+                    ok = True
+                    for x, y in new_unit.members:
+                        if x < 0 or x >= bw or y < 0 or y >= bh:
+                            ok = False
+                            break
+                    if not ok or new_unit in placements:
+                        continue
+                    placements.add(new_unit)
+        return frozenset(placements)
+
+    def get(self, spawned, check_time=None):
+        try:
+            return self.placements[spawned]
+        except KeyError:
+            placements = self.compute(spawned, check_time)
+            self.placements[spawned] = placements
+            return placements
+
+    def touched_cells(self, spawned, check_time=None):
+        """
+        Index from each cell (col, row) to the placements that cover it, or that cover it
+        after any move. Whether a placement is lockable only depends on these cells.
+        Placements of the same shape whose pivots are an even number of rows apart are
+        translations of each other in offset coordinates, so the cells touched by the moves
+        are only computed once for each shape and row parity.
+        """
+        try:
+            return self.cells[spawned]
+        except KeyError:
+            bw = self.width
+            bh = self.height
+            by_cell = {}
+            shapes = {}
+            for i, unit in enumerate(self.get(spawned, check_time)):
+                if check_time is not None and i % bw == 0:
+                    check_time()
+                pcol, prow = unit.pivot
+                shape = (prow % 2, tuple(sorted((col - pcol, row - prow) for col, row in unit.members)))
+                offsets = shapes.get(shape)
+                if offsets is None:
+                    touched = set(unit.members)
+                    for move in game.MOVES:
+                        touched.update(unit.action(move).members)
+                    offsets = shapes[shape] = [(col - pcol, row - prow) for col, row in touched]
+                for dcol, drow in offsets:
+                    col = pcol + dcol
+                    row = prow + drow
+                    if 0 <= col < bw and 0 <= row < bh:
+                        by_cell.setdefault((col, row), []).append(unit)
+            self.cells[spawned] = by_cell
+            return by_cell
+
+    def clear(self):
+        self.placements = {}
+        self.cells = {}
+
+_tables = {}
+
+def get_table(width, height, units):
+    """
+    The table of a problem. Only the table of the last problem is kept, like the unit
+    caches of game.Unit.use_cache_scope, so a worker solving many problems doesn't keep
+    the tables and units of the earlier ones.
+    """
+    key = (width, height, tuple(unit.footprint for unit in units))
+    try:
+        return _tables[key]
+    except KeyError:
+        clear_tables()
+        table = PlacementTable(width, height)
+        _tables[key] = table
+        return table
+
+def clear_tables():
+    for table in _tables.values():
+        table.clear()
+    _tables.clear()
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
+import collections
+
 CMD_GROUPS = [['p', "'", '!', '.', '0', '3'],
               ['b', 'c', 'e', 'f', 'y', '2'],
               ['a', 'g', 'h', 'i', 'j', '4'],
@@ -14,6 +16,220 @@ for cmds in CMD_GROUPS:
     for cmd in cmds:
         SUBST[cmd] = set(cmds)
 
+# Index of the group each command character belongs to
+CMD_CLASS = {}
+
+for ix, cmds in enumerate(CMD_GROUPS):
+    for cmd in cmds:
+        CMD_CLASS[cmd] = ix
+
+PHRASE_BONUS = 300
+
+def phrase_score(phrase):
+    """Points for one occurrence of a phrase, the bonus for using it at all comes on top."""
+    return 2 * len(phrase)
+
+def count_phrase(cmdstr, phrase):
+    """Number of times phrase occurs in cmdstr, overlapping occurrences included."""
+    count = 0
+    ix = cmdstr.find(phrase)
+    while ix >= 0:
+        count += 1
+        ix = cmdstr.find(phrase, ix + 1)
+    return count
+
+def power_score(cmdstr, phrases):
+    counts = {}
+    score = 0
+    for phrase in phrases:
+        reps = count_phrase(cmdstr, phrase.lower())
+        counts[phrase] = reps
+        if reps > 0:
+            score += phrase_score(phrase) * reps + PHRASE_BONUS
+    return score, counts
+
+class PhraseMatcher(object):
+    """
+    Aho-Corasick automaton over the command groups for a set of phrases. A command string
+    is scanned once for all phrases, characters match a phrase character if they are in
+    the same group, i.e. issue the same command.
+    """
+    def __init__(self, phrases):
+        self.phrases = []
+        for phrase in phrases:
+            p = phrase.lower()
+            if p and p not in self.phrases and all(c in CMD_CLASS for c in p):
+                self.phrases.append(p)
+        goto = [{}]
+        out = [[]]
+        for pi, p in enumerate(self.phrases):
+            state = 0
+            for c in p:
+                k = CMD_CLASS[c]
+                nxt = goto[state].get(k)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][k] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(pi)
+        groups = len(CMD_GROUPS)
+        fail = [0] * len(goto)
+        delta = [[0] * groups for _ in goto]
+        queue = collections.deque()
+        for k, nxt in goto[0].iteritems():
+            delta[0][k] = nxt
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            # fail[state] is shallower, so its output is already complete
+            out[state] = out[state] + out[fail[state]]
+            for k in range(groups):
+                nxt = goto[state].get(k)
+                if nxt is None:
+                    delta[state][k] = delta[fail[state]][k]
+                else:
+                    fail[nxt] = delta[fail[state]][k]
+                    delta[state][k] = nxt
+                    queue.append(nxt)
+        self.delta = delta
+        self.out = out
+
+    def find(self, cmdstr):
+        """All occurrences in cmdstr, overlapping ones included, as (start, phrase index)."""
+        matches = []
+        delta = self.delta
+        out = self.out
+        lengths = [len(p) for p in self.phrases]
+        state = 0
+        for i, c in enumerate(cmdstr):
+            k = CMD_CLASS.get(c)
+            if k is None:
+                state = 0
+                continue
+            state = delta[state][k]
+            for pi in out[state]:
+                matches.append((i + 1 - lengths[pi], pi))
+        return matches
+
+    def place(self, cmdstr):
+        """
+        Chooses non-overlapping occurrences to substitute. Occurrence points are maximised
+        exactly, then phrases that didn't make it are forced in one at a time as long as
+        their bonus makes up for what they displace.
+        """
+        n = len(cmdstr)
+        matches = self.find(cmdstr)
+        weights = [phrase_score(p) for p in self.phrases]
+        placement = self._best(n, matches, weights, [])
+        score = self.score(placement)
+        locked = []
+        for pi in sorted(range(len(self.phrases)), key=lambda pi: -len(self.phrases[pi])):
+            if pi in set(m[1] for m in placement):
+                continue
+            occurrence = self._best_occurrence(n, matches, weights, locked, pi)
+            if occurrence is None:
+                continue
+            candidate = self._best(n, matches, weights, locked + [occurrence])
+            candidate_score = self.score(candidate)
+            if candidate_score > score:
+                locked.append(occurrence)
+                placement = candidate
+                score = candidate_score
+        return placement
+
+    def score(self, placement):
+        used = set(pi for start, pi in placement)
+        return sum(phrase_score(self.phrases[pi]) for start, pi in placement) + PHRASE_BONUS * len(used)
+
+    def _blocked(self, n, locked):
+        """Prefix counts of positions covered by locked occurrences."""
+        covered = [0] * (n + 1)
+        for start, pi in locked:
+            for i in range(start, start + len(self.phrases[pi])):
+                covered[i + 1] = 1
+        for i in range(n):
+            covered[i + 1] += covered[i]
+        return covered
+
+    def _prefix(self, n, matches, weights, locked, covered):
+        """best[i] is the best points in cmdstr[:i], with choice[i] the occurrence ending at i."""
+        ending = [[] for _ in range(n + 1)]
+        for start, pi in matches:
+            end = start + len(self.phrases[pi])
+            if covered[end] == covered[start]:
+                ending[end].append((start, pi))
+        for start, pi in locked:
+            ending[start + len(self.phrases[pi])].append((start, pi))
+        best = [0] * (n + 1)
+        choice = [None] * (n + 1)
+        for i in range(1, n + 1):
+            if covered[i] == covered[i - 1]:
+                b = best[i - 1]
+            else:
+                # Inside a locked occurrence, only reachable through it
+                b = None
+            c = None
+            for start, pi in ending[i]:
+                if best[start] is not None and (b is None or best[start] + weights[pi] > b):
+                    b = best[start] + weights[pi]
+                    c = (start, pi)
+            best[i] = b
+            choice[i] = c
+        return best, choice
+
+    def _best(self, n, matches, weights, locked):
+        covered = self._blocked(n, locked)
+        best, choice = self._prefix(n, matches, weights, locked, covered)
+        placement = []
+        i = n
+        while i > 0:
+            if choice[i] is None:
+                i -= 1
+            else:
+                placement.append(choice[i])
+                i = choice[i][0]
+        placement.reverse()
+        return placement
+
+    def _best_occurrence(self, n, matches, weights, locked, pi):
+        """The occurrence of phrase pi that displaces the fewest points, if any."""
+        covered = self._blocked(n, locked)
+        prefix, _ = self._prefix(n, matches, weights, locked, covered)
+        # The same dynamic programming on the reversed string gives the suffix values
+        reverse_matches = [(n - start - len(self.phrases[p]), p) for start, p in matches]
+        reverse_locked = [(n - start - len(self.phrases[p]), p) for start, p in locked]
+        reverse_covered = self._blocked(n, reverse_locked)
+        reverse, _ = self._prefix(n, reverse_matches, weights, reverse_locked, reverse_covered)
+        best = None
+        occurrence = None
+        for start, p in matches:
+            if p != pi:
+                continue
+            end = start + len(self.phrases[p])
+            if covered[end] != covered[start] or prefix[start] is None or reverse[n - end] is None:
+                continue
+            value = prefix[start] + weights[p] + reverse[n - end]
+            if best is None or value > best:
+                best = value
+                occurrence = (start, p)
+        return occurrence
+
+def substitute(cmdstr, phrases):
+    """Replaces commands in cmdstr with equivalent phrases, for as many points as possible."""
+    matcher = PhraseMatcher(phrases)
+    if not matcher.phrases:
+        return cmdstr
+    s = []
+    pos = 0
+    for start, pi in matcher.place(cmdstr):
+        s.append(cmdstr[pos:start])
+        s.append(matcher.phrases[pi])
+        pos = start + len(matcher.phrases[pi])
+    s.append(cmdstr[pos:])
+    return ''.join(s)
+
 def search(cmdstr, phrase):
     pl = len(phrase)
     if pl > len(cmdstr):
@@ -28,14 +244,4 @@ def search(cmdstr, phrase):
     return None
 
 def subst(cmdstr, phrase):
-    p = phrase.lower()
-    pl = len(p)
-    s = []
-    ci = search(cmdstr, p)
-    while ci is not None:
-        s.append(cmdstr[:ci])
-        s.append(p)
-        cmdstr = cmdstr[ci+pl:]
-        ci = search(cmdstr, p)
-    s.append(cmdstr)
-    return ''.join(s)
+    return substitute(cmdstr, [phrase])
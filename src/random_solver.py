@@ -5,6 +5,9 @@ import random
 import solver
 
 class RandomSolver(solver.BaseSolver):
+    def portfolio(self, size):
+        return [self.variant(restart=restart) for restart in range(size)]
+
     def solve(self, g, verbosity):
         commands = []
         cmds = {game.CMD_E: 'b',
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import argparse
+import game
+import json
+import os
+import power
+import solver
+import time
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+def replay(problem, seed_index, cmdstr, phrases=(), board_class=game.BitBoard):
+    """
+    Plays a solution on a problem and checks that it is legal. Returns a dict with the
+    move score, the power score, the number of times each phrase was used and the error,
+    which is None for a legal solution. Scores are those of the commands played up to an
+    error.
+    """
+    g = problem.make_game(seed_index, board_class)
+    char_cmds = game.CHAR_CMDS
+    error = None
+    played = 0
+    for c in cmdstr.lower():
+        if c in game.IGNORED_CHARS:
+            played += 1
+            continue
+        cmd = char_cmds.get(c)
+        if cmd is None:
+            error = 'Invalid command %r at %d' % (c, played)
+            break
+        if g.unit is None:
+            error = 'Command after the end of the game at %d' % played
+            break
+        try:
+            g.move_unit(cmd)
+        except ValueError:
+            error = 'Repeated position at %d' % played
+            break
+        played += 1
+    score, counts = power.power_score(cmdstr[:played].lower(), phrases)
+    return {"problemId": problem.id,
+            "seed": problem.source_seeds[seed_index],
+            "move_score": int(g.score),
+            "power_score": score,
+            "score": int(g.score) + score,
+            "phrases": counts,
+            "units": g.num_units,
+            "error": error,
+    }
+
+def read_solutions(filename):
+    """Reads a JSON array of solutions, or the JSON Lines written by the solvers with -o."""
+    with open(filename) as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            return solver.read_solutions(filename)
+
+def run():
+    parser = argparse.ArgumentParser(description='Replays solutions and checks that they are legal.')
+    parser.add_argument('-f', dest='files', action='append', required=True, help='solution file')
+    parser.add_argument('-p', dest='power', action='append', default=[])
+    parser.add_argument('-d', dest='data', action='store', default=DATA_DIR, help='directory with the problems')
+    parser.add_argument('-b', dest='board', action='store', choices=sorted(game.BOARDS), default='bit')
+    parser.add_argument('-v', dest='verbosity', action='store', type=int, default=0)
+    args = parser.parse_args()
+
+    problems = {}
+    results = []
+    start = time.time()
+    for f in args.files:
+        for solution in read_solutions(f):
+            pid = solution["problemId"]
+            if pid not in problems:
+                problems[pid] = game.Problem.load(os.path.join(args.data, 'problem_%d.json' % pid))
+            problem = problems[pid]
+            seed_index = problem.source_seeds.index(solution["seed"])
+            result = replay(problem, seed_index, solution["solution"], args.power, game.BOARDS[args.board])
+            if args.verbosity > 0:
+                print "problem %3d seed %10d: score %6d (%d moves + %d power)%s" % (
+                    result["problemId"], result["seed"], result["score"], result["move_score"],
+                    result["power_score"], ", " + result["error"] if result["error"] else "")
+            results.append(result)
+    elapsed = time.time() - start
+    summary = {"solutions": len(results),
+               "errors": len([r for r in results if r["error"]]),
+               "score": sum([r["score"] for r in results]),
+               "phrases": dict((p, sum([r["phrases"][p] for r in results])) for p in args.power),
+               "seconds": elapsed,
+               "results": results,
+    }
+    print json.dumps(summary, sort_keys=True)
+
+if __name__ == '__main__':
+    run()
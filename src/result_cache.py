@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+import glob
+import hashlib
+import json
+import os
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'icfp2015')
+# Bytes kept on disk, the least recently used solutions are removed above this
+MAX_BYTES = 200 * 1024 * 1024
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def file_hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def code_hash():
+    """Hash of the solver sources, so that changing the code invalidates the cache."""
+    h = hashlib.sha1()
+    for filename in sorted(glob.glob(os.path.join(SOURCE_DIR, '*.py'))):
+        if os.path.basename(filename).startswith('test_'):
+            continue
+        h.update(os.path.basename(filename))
+        h.update(file_hash(filename))
+    return h.hexdigest()
+
+class ResultCache(object):
+    """
+    Solutions stored on disk, one JSON file per job named by the hash of everything the
+    solution depends on: the problem file, the seed, the solver and its options, the power
+    phrases and the solver code. When the files take up more than max_bytes, the least
+    recently used ones are removed.
+    """
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.code = code_hash()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.size = sum(os.path.getsize(f) for f in self.files())
+
+    def files(self):
+        return glob.glob(os.path.join(self.directory, '*.json'))
+
+    def key(self, problem_hash, seed, solver_name, options, phrases):
+        description = json.dumps([problem_hash, seed, solver_name, options, sorted(phrases or []), self.code],
+                                 sort_keys=True)
+        return hashlib.sha1(description).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """The cached solution, or None. A hit counts as a use for the eviction order."""
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                solution = json.load(f)
+            os.utime(path, None)
+            return solution
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put(self, key, solution):
+        path = self.path(key)
+        if os.path.exists(path):
+            self.size -= os.path.getsize(path)
+        # Written to the side and renamed, so a crash never leaves half a solution
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(solution, f)
+        os.rename(tmp, path)
+        self.size += os.path.getsize(path)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        for f in self.files():
+            try:
+                entries.append((os.path.getmtime(f), os.path.getsize(f), f))
+            except OSError:
+                pass
+        entries.sort()
+        self.size = sum(size for mtime, size, f in entries)
+        for mtime, size, f in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(f)
+                self.size -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for f in self.files():
+            os.remove(f)
+        self.size = 0
@@ -1,52 +1,77 @@
 #!/usr/bin/env python
 
+import cache
 import game
 import operator
 import solver
 
-def score(g):
-    # Award being far down
+def score(g, unit):
+    """Scores locking unit, after it was locked. Awards it being far down."""
     downness = 0
-    if g.unit:
-        downness = sum([y for x, y in g.unit.members])
-    return g.score + downness / (1 + g.score)
+    if unit:
+        downness = sum([y for x, y in unit.members])
+    return g.score, downness
 
-def do_solve(g, m, s):
+def do_solve(g, m, s, table=None):
+    """
+    Collects the score of every lock reachable from the position of g into s, keyed by the
+    moves. With a cache.TranspositionTable, positions reached before by other moves are
+    searched only once, which reaches more distinct locks before the limit.
+    """
     if len(s) > 1000:
         return
     moves = g.moves()
     non_lock = moves[game.MOVE_OK]
     lock = moves[game.MOVE_LOCK]
     candidates = non_lock + lock
-    preference = {"SE": 1, "SW": 2, "E": 3, "W": 4, "CW": 5, "CCW": 6}
+    preference = {game.CMD_SE: 1, game.CMD_SW: 2, game.CMD_E: 3, game.CMD_W: 4, game.CMD_CW: 5, game.CMD_CCW: 6}
     if not candidates:
-        s[tuple(m)] = score(g)
+        s[tuple(m)] = score(g, g.unit)
     else:
         for move in sorted(candidates, key=lambda x: preference[x]):
-            new_g = g.clone()
-            new_g.move_unit(move)
-            new_m = m[:]
-            new_m.append(move)
+            # The game spawns the next unit on a lock, score where this one locked
+            unit = g.unit
+            record = g.apply_move(move)
+            m.append(move)
             if move in non_lock:
-                do_solve(new_g, new_m, s)
+                if table is None or table.visit(g):
+                    do_solve(g, m, s, table)
             else:
-                s[tuple(new_m)] = score(new_g)
+                s[tuple(m)] = score(g, unit)
+            m.pop()
+            g.undo_move(record)
 
 class SearchSolver(solver.BaseSolver):
-    def solve(self, g):
-        commands = []
-        cmds = {'E': 'b',
-                'W': 'p',
-                'SE': 'l',
-                'SW': 'a',
-                'CW': 'd',
-                'CCW': 'k'}
+    transpositions = False
+
+    def add_arguments(self, parser):
+        # Reaches more distinct locks before the limit of do_solve, in less time
+        parser.add_argument('-x', dest='transpositions', action='store_true',
+                            help='search each position of a unit only once')
+
+    def use_arguments(self, args):
+        self.transpositions = args.transpositions
+
+    def solve(self, g, verbosity):
+        commands = self.commands = []
+        cmds = {game.CMD_E: 'b',
+                game.CMD_W: 'p',
+                game.CMD_SE: 'l',
+                game.CMD_SW: 'a',
+                game.CMD_CW: 'd',
+                game.CMD_CCW: 'k'}
+        self.start_budget()
+        table = cache.TranspositionTable() if self.transpositions else None
         while True:
             scores = {}
             moves = []
             if g.unit is None:
                 break
-            do_solve(g, moves, scores)
+            if self.budget_level(g.max_units - g.num_units + 1) == solver.BUDGET_STOP:
+                break
+            if table is not None:
+                table.visit(g)
+            do_solve(g, moves, scores, table)
             # Take the best one
             best = max(scores.iteritems(), key=operator.itemgetter(1))
             best_moves = best[0]
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import atexit
+import itertools
+import mmap
+import os
+import signal
+import tempfile
+
+# Memory backed on Linux, any temporary directory works elsewhere
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+_names = itertools.count()
+
+# (pid, path) of the files of the buffers not closed yet. A process that is terminated, like
+# the pool workers at the -t deadline, never collects its buffers, so it removes their
+# files on exit and on SIGTERM instead.
+_open_files = set()
+# Pid of the process that installed the handlers, forked processes install their own
+_handlers_pid = None
+
+def remove_files():
+    """Removes the files of the buffers that this process created and hasn't closed."""
+    pid = os.getpid()
+    for owner, path in list(_open_files):
+        if owner == pid:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            _open_files.discard((owner, path))
+
+def _terminate(signum, frame):
+    remove_files()
+    # Die of the signal like without the handler
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+def _install_handlers():
+    global _handlers_pid
+    if _handlers_pid == os.getpid():
+        return
+    _handlers_pid = os.getpid()
+    atexit.register(remove_files)
+    try:
+        if signal.getsignal(signal.SIGTERM) in (signal.SIG_DFL, _terminate):
+            signal.signal(signal.SIGTERM, _terminate)
+    except ValueError:
+        # Not the main thread, the files are still removed at exit
+        pass
+
+class SharedBuffer(object):
+    """
+    A memory mapped file that other processes can attach to by name, so that they all see
+    the same memory without copying it. The process that created it removes the file when
+    the buffer is closed or garbage collected, or when the process exits or is terminated.
+    """
+    def __init__(self, size, name=None):
+        self.owner = name is None
+        # Forked processes inherit the buffer, but only the creator removes the file
+        self.pid = os.getpid()
+        if self.owner:
+            name = 'icfp2015-%d-%d' % (os.getpid(), next(_names))
+        self.name = name
+        self.size = size
+        self.path = os.path.join(SHARED_DIR, name)
+        if self.owner:
+            _install_handlers()
+            _open_files.add((self.pid, self.path))
+        with open(self.path, 'w+b' if self.owner else 'r+b') as f:
+            if self.owner:
+                f.truncate(size)
+            self.map = mmap.mmap(f.fileno(), size)
+
+    @staticmethod
+    def attach(name, size):
+        return SharedBuffer(size, name)
+
+    def close(self):
+        if self.owner and self.path is not None and os.getpid() == self.pid:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            _open_files.discard((self.pid, self.path))
+        self.path = None
+
+    def __del__(self):
+        self.close()
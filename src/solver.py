@@ -1,38 +1,321 @@
 #!/usr/bin/env python
 
 import argparse
+import copy
 import game
 import hx
+import itertools
 import json
 import multiprocessing as mp
 import power
 import random
+import resource
+import result_cache
+import time
 import traceback
 
 def pickle_helper(arg):
     solver, problem, seed, seed_index, verbosity, phrases = arg
     return solver.runSeed(problem, seed, seed_index, verbosity, phrases)
 
+# The jobs being scheduled. The pool processes are forked after this is set, so they get
+# the solver and problem of each job without pickling them.
+_jobs = None
+
+def indexed_helper(index):
+    return index, pickle_helper(_jobs[index])
+
+def problem_cost(problem):
+    """Rough estimate of the time a seed takes, from the board area and the number of units."""
+    return problem.width * problem.height * problem.source_length
+
+def expected_cost(params):
+    return problem_cost(params[1])
+
+def share_time(costs, cores, job_time):
+    """
+    Seconds per unit of expected cost for jobs of the given costs, so that they use up
+    job_time on every core. No job can take more than job_time, so the time that the
+    largest jobs can't use goes to the others. Returns None if every job can take job_time,
+    as when there are no more jobs than cores.
+    """
+    costs = sorted(costs, reverse=True)
+    time_left = cores * job_time
+    cost_left = sum(costs)
+    for cost in costs:
+        if cost_left <= 0 or time_left <= 0:
+            break
+        per_cost = time_left / cost_left
+        if cost * per_cost <= job_time:
+            return per_cost
+        # This job gets job_time, the rest is shared among the smaller ones
+        time_left -= job_time
+        cost_left -= cost
+    return None
+
+PAGE_KB = resource.getpagesize() / 1024
+
+def resident_memory():
+    """
+    Memory the process uses now in kB. Unlike the peak memory of getrusage, it goes down
+    again when memory is freed. Falls back to the peak where /proc isn't available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_KB
+    except (IOError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# How much effort a solver can afford for the next unit
+BUDGET_FULL = 0
+BUDGET_CHEAP = 1
+BUDGET_GREEDY = 2
+BUDGET_STOP = 3
+BUDGET_NAMES = ('full', 'cheap', 'greedy', 'stop')
+
+# Seconds per unit that greedy placement is assumed to need
+GREEDY_UNIT_TIME = 0.002
+# Times its share of the time left that a unit may take before its search is cut short
+UNIT_TIME_SHARE = 10
+# Per unit placed at a lower level, the time per unit of the higher levels is scaled by
+# this, so that they are tried again once they may fit. Units get cheaper as the board
+# fills up and the caches warm up.
+UNIT_TIME_DECAY = 0.8
+# Settings of a run that all solvers of a portfolio share
+RUN_SETTINGS = ('board', 'timing_file', 'deadline', 'memory_limit', 'time_per_cost')
+
+# run options that don't change the solutions, left out of the result cache key. The time,
+# cores and memory only change solutions that the budget cut short, which aren't cached.
+CACHE_INDEPENDENT_OPTIONS = ('files', 'verbosity', 'profile', 'timing_file', 'output', 'resume',
+                             'cache', 'no_cache', 'time', 'cores', 'memory')
+
+def cache_options(args):
+    """The run options that the result cache key depends on."""
+    return dict((k, v) for k, v in vars(args).iteritems() if k not in CACHE_INDEPENDENT_OPTIONS)
+
+# Part of the -t time that jobs may use, the rest is left for collecting the results, but
+# at least DEADLINE_MARGIN seconds so that jobs return before the pool is terminated
+DEADLINE_FRACTION = 0.95
+DEADLINE_MARGIN = 2.0
+
+class OutOfTime(Exception):
+    """Raised by anytime solvers when the time of the current unit has run out."""
+
 class BaseSolver(object):
+    board = 'list'
+    # Solvers that time their phases set this to a timing.PhaseTimer in solve
+    timer = None
+    timing_file = None
+    # Absolute time by which every job must have returned, and memory per job in kB
+    deadline = None
+    memory_limit = None
+    # Seconds per unit of problem_cost that a job may use, and the resulting deadline of
+    # the job being solved
+    time_per_cost = None
+    job_deadline = None
+    # Time by which the search for the current unit must end, see check_time
+    unit_deadline = None
+    # Set when a unit of the seed being solved got less than the full budget
+    budget_cut = False
+    # Anytime solvers keep the commands played so far here, so they survive an exception
+    commands = None
+    # The power phrases of the run, for solvers that plan for them
+    phrases = ()
+    # Added to the seed of the random module, for restarts of random solvers
+    restart = 0
+
+    def add_arguments(self, parser):
+        """Override to add solver specific command line arguments."""
+        pass
+
+    def use_arguments(self, args):
+        """Override to pick up the solver specific command line arguments."""
+        pass
+
+    def start_budget(self):
+        # Recent time per unit at each budget level
+        self.unit_times = {}
+        self.unit_start = None
+        self.unit_level = None
+        self.unit_aborted = False
+        self.unit_deadline = None
+        self.memory_exceeded = False
+
+    def budget_level(self, units_left):
+        """
+        Called by anytime solvers before placing each unit. Returns how much effort the
+        solver can afford for the unit: the highest level whose recent time per unit, for
+        every unit left, fits in the time until the deadline after keeping enough time to
+        place the units left greedily. Also sets the deadline of the unit, see check_time.
+        """
+        now = time.time()
+        if self.unit_start is not None:
+            elapsed = now - self.unit_start
+            old = self.unit_times.get(self.unit_level)
+            if old is None or self.unit_aborted:
+                # A unit that ran out of time needs at least that long
+                self.unit_times[self.unit_level] = max(elapsed, old or 0)
+            else:
+                self.unit_times[self.unit_level] = 0.8 * old + 0.2 * elapsed
+        self.unit_start = now
+        self.unit_aborted = False
+        self.unit_deadline = None
+        level = self.unit_level = self.choose_level(now, units_left)
+        if level != BUDGET_FULL:
+            self.budget_cut = True
+        return level
+
+    def choose_level(self, now, units_left):
+        level = BUDGET_FULL
+        if self.memory_limit is not None:
+            if resident_memory() > self.memory_limit:
+                if not self.memory_exceeded:
+                    self.memory_exceeded = True
+                    self.release_memory()
+                level = BUDGET_CHEAP
+            else:
+                # Back below the limit, caches may be dropped again when it is exceeded
+                self.memory_exceeded = False
+        if self.job_deadline is None:
+            return level
+        remaining = self.job_deadline - now
+        if remaining <= 0:
+            return BUDGET_STOP
+        greedy_time = max(GREEDY_UNIT_TIME, self.unit_times.get(BUDGET_GREEDY, 0))
+        spare = remaining - units_left * greedy_time
+        if spare <= 0:
+            return BUDGET_GREEDY
+        while level < BUDGET_GREEDY:
+            unit_time = self.unit_times.get(level)
+            if unit_time is None or unit_time * units_left <= spare:
+                break
+            self.unit_times[level] = UNIT_TIME_DECAY * unit_time
+            level += 1
+        if level < BUDGET_GREEDY:
+            self.unit_deadline = now + min(spare, UNIT_TIME_SHARE * remaining / units_left)
+        return level
+
+    def check_time(self):
+        """Raises OutOfTime once the current unit has used up its time."""
+        if self.unit_deadline is not None and time.time() > self.unit_deadline:
+            self.unit_aborted = True
+            self.budget_cut = True
+            raise OutOfTime()
+
+    def release_memory(self):
+        """Called when the memory limit gets exceeded. Override to drop solver caches."""
+        game.Unit.use_cache_scope(None)
+
+    def portfolio(self, size):
+        """
+        Override to return up to size solver configurations that -P tries on every seed,
+        the best solution of them is kept.
+        """
+        return [self]
+
+    def variant(self, solver_class=None, **attributes):
+        """
+        A solver for the portfolio with the settings of this run and the given attributes,
+        a copy of this solver unless solver_class is given.
+        """
+        if solver_class is None:
+            s = copy.copy(self)
+        else:
+            s = solver_class()
+            for name in RUN_SETTINGS:
+                setattr(s, name, getattr(self, name))
+        for name, value in attributes.iteritems():
+            setattr(s, name, value)
+        return s
+
     def runSeed(self, problem, seed, seed_index, verbosity, phrases):
-        random.seed(seed)
-        g = problem.make_game(seed_index)
+        random.seed(seed + self.restart)
+        self.commands = None
+        self.phrases = phrases or ()
+        self.budget_cut = False
+        self.job_deadline = self.deadline
+        if self.time_per_cost is not None:
+            # The job's share of the time, it may start late so it can't exceed the deadline
+            self.job_deadline = min(self.deadline, time.time() + self.time_per_cost * problem_cost(problem))
+        error = None
+        g = None
         try:
+            # Inside the try, so a seed that can't even be set up is reported like any error
+            g = problem.make_game(seed_index, game.BOARDS[self.board])
             commands = self.solve(g, verbosity)
         except Exception as e:
             if verbosity > 0:
                 traceback.print_exc(e)
-            commands = list('error')
+            error = repr(e)
+            commands = self.commands if self.commands else list('error')
         cmdstr = ''.join(commands)
+        score = g.score if g is not None else 0
         if phrases:
-            cmdstr = power.subst(cmdstr, phrases[0])
+            cmdstr = power.substitute(cmdstr, phrases)
+            score += power.power_score(cmdstr, phrases)[0]
         solution = {
             "problemId": problem.id,
             "seed": seed,
-            "solution": cmdstr
+            "solution": cmdstr,
+            # Popped by run, used to pick the best solution of a portfolio
+            "score": score,
         }
+        if self.timing_file and self.timer is not None:
+            solution["timing"] = self.timer.summary()
+        # Popped by run, solutions that failed aren't cached
+        if error is not None:
+            solution["error"] = error
+        # Popped by run, neither are solutions that the time or memory limit cut short
+        if self.budget_cut:
+            solution["budget_cut"] = True
         return solution
 
+    def schedule(self, params, cores, timeout):
+        """
+        Runs the jobs of all problems in one pool, longest expected job first, so that short
+        jobs fill up the cores at the end. Yields (index in params, solution) as soon as
+        each job finishes.
+        """
+        order = sorted(range(len(params)), key=lambda i: expected_cost(params[i]), reverse=True)
+        global _jobs
+        deadline = time.time() + timeout
+        _jobs = params
+        pool = mp.Pool(cores)
+        done = set()
+        try:
+            results = pool.imap_unordered(indexed_helper, order)
+            for _ in range(len(params)):
+                index, solution = results.next(max(0, deadline - time.time()))
+                done.add(index)
+                yield index, solution
+        except mp.TimeoutError:
+            # Keep what has been solved, an empty solution still scores 0
+            for index in order:
+                if index not in done:
+                    solver, problem, seed = params[index][:3]
+                    yield index, {"problemId": problem.id, "seed": seed, "solution": "", "score": 0, "error": "timeout"}
+        finally:
+            pool.terminate()
+            _jobs = None
+
+    def best_solutions(self, results, seeds):
+        """
+        Yields (seed index, solution) with the best solution of each seed, as soon as all
+        its jobs are done. results yields (job index, solution) and seeds holds the seed
+        index of each job.
+        """
+        left = {}
+        for index in seeds:
+            left[index] = left.get(index, 0) + 1
+        best = {}
+        for job, solution in results:
+            index = seeds[job]
+            if index not in best or solution["score"] > best[index]["score"]:
+                best[index] = solution
+            left[index] -= 1
+            if left[index] == 0:
+                yield index, best.pop(index)
+
     def run(self):
         parser = argparse.ArgumentParser()
         parser.add_argument('-f', dest='files', action='append', required=True)
@@ -42,17 +325,140 @@ class BaseSolver(object):
         parser.add_argument('-c', dest='cores', action='store', type=int, default=1)
         parser.add_argument('-v', dest='verbosity', action='store', type=int, default=0)
         parser.add_argument('-k', dest='profile', action='store_true')
+        parser.add_argument('-b', dest='board', action='store', choices=sorted(game.BOARDS), default='list')
+        parser.add_argument('-T', dest='timing_file', action='store',
+                            help='write the time spent in each solver phase to this JSON file')
+        parser.add_argument('-o', dest='output', action='store',
+                            help='write each solution to this file as soon as it is done, one JSON object per line')
+        parser.add_argument('-R', dest='resume', action='store_true',
+                            help='skip the seeds already solved in the -o file and append to it')
+        parser.add_argument('-C', dest='cache', action='store', default=result_cache.DEFAULT_DIR,
+                            help='directory of the cache of solutions from earlier runs')
+        parser.add_argument('-n', dest='no_cache', action='store_true',
+                            help='solve every seed without using the cache of solutions')
+        parser.add_argument('-P', dest='portfolio', action='store', type=int,
+                            help='solve every seed with up to this many solver configurations and keep the best')
+        self.add_arguments(parser)
         args = parser.parse_args()
+        if args.resume and not args.output:
+            parser.error('-R needs -o')
+        self.board = args.board
+        self.timing_file = args.timing_file
+        job_time = max(0, min(DEADLINE_FRACTION * args.time, args.time - DEADLINE_MARGIN))
+        self.deadline = time.time() + job_time
+        if args.memory is not None:
+            # -m is in MB for all cores together
+            self.memory_limit = args.memory * 1024 / max(1, args.cores)
+        self.use_arguments(args)
 
-        solutions = []
+        solved = set()
+        if args.resume:
+            truncate_partial_line(args.output)
+            solved = set([(s["problemId"], s["seed"]) for s in read_solutions(args.output)])
+        cache = None if args.no_cache else result_cache.ResultCache(args.cache)
+        options = cache_options(args)
+        params = []
+        keys = []
+        cached = {}
         for f in args.files:
             problem = game.Problem.load(f)
-            params = [(self, problem, seed, seed_index, args.verbosity, args.power) for seed_index, seed in enumerate(problem.source_seeds)]
-            # cProfile doesn't work with multiprocessing
-            if args.profile:
-                s = map(pickle_helper, params)
-            else:
-                p = mp.Pool(args.cores)
-                s = p.map_async(pickle_helper, params).get(args.time)
-            solutions.extend(s)
-        print json.dumps(solutions)
+            problem_hash = result_cache.file_hash(f) if cache is not None else None
+            for seed_index, seed in enumerate(problem.source_seeds):
+                if (problem.id, seed) in solved:
+                    continue
+                key = None
+                if cache is not None:
+                    key = cache.key(problem_hash, seed, self.__class__.__name__, options, args.power)
+                    solution = cache.get(key)
+                    if solution is not None:
+                        cached[len(params)] = solution
+                params.append((self, problem, seed, seed_index, args.verbosity, args.power))
+                keys.append(key)
+        if not params:
+            return
+        pending = [i for i in range(len(params)) if i not in cached]
+        configs = self.portfolio(args.portfolio) if args.portfolio else [self]
+        jobs = [(i, config) for i in pending for config in configs]
+        job_params = [(config,) + params[i][1:] for i, config in jobs]
+        cores = 1 if args.profile else args.cores
+        if jobs:
+            self.time_per_cost = share_time([expected_cost(p) for p in job_params], cores, job_time)
+        for config in configs:
+            config.time_per_cost = self.time_per_cost
+        # cProfile doesn't work with multiprocessing
+        if args.profile:
+            solved_jobs = ((j, pickle_helper(p)) for j, p in enumerate(job_params))
+        else:
+            solved_jobs = self.schedule(job_params, args.cores, args.time)
+        solved_now = self.best_solutions(solved_jobs, [i for i, config in jobs])
+        results = itertools.chain(cached.iteritems(), solved_now)
+        timings = []
+        if args.output:
+            with open(args.output, 'a' if args.resume else 'w') as f:
+                for index, solution in results:
+                    timings.append(self.pop_timing(solution))
+                    self.finish_solution(cache, keys[index], index in cached, solution)
+                    f.write(json.dumps(solution) + '\n')
+                    f.flush()
+        else:
+            solutions = len(params) * [None]
+            for index, solution in results:
+                timings.append(self.pop_timing(solution))
+                self.finish_solution(cache, keys[index], index in cached, solution)
+                solutions[index] = solution
+            print json.dumps(solutions)
+        if self.timing_file:
+            with open(self.timing_file, 'w') as f:
+                json.dump(timings, f, indent=1, sort_keys=True)
+
+    def finish_solution(self, cache, key, from_cache, solution):
+        """
+        Removes the score, error and budget cut mark of a solution, and caches it if there was
+        no error and it got the full budget.
+        """
+        solution.pop("score", None)
+        error = solution.pop("error", None)
+        budget_cut = solution.pop("budget_cut", False)
+        if cache is not None and not from_cache and error is None and not budget_cut:
+            cache.put(key, solution)
+
+    def pop_timing(self, solution):
+        return {"problemId": solution["problemId"], "seed": solution["seed"], "timing": solution.pop("timing", None)}
+
+def truncate_partial_line(filename, chunk_size=4096):
+    """
+    Cuts off a last line without a newline, left by a run that crashed while writing it,
+    so that solutions appended after it don't follow a corrupt line.
+    """
+    try:
+        f = open(filename, 'r+b')
+    except IOError:
+        return
+    with f:
+        f.seek(0, 2)
+        end = f.tell()
+        pos = end
+        while pos > 0:
+            start = max(0, pos - chunk_size)
+            f.seek(start)
+            newline = f.read(pos - start).rfind('\n')
+            if newline >= 0:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos < end:
+            f.truncate(pos)
+
+def read_solutions(filename):
+    """Reads the solutions written with -o, ignoring a last line cut short by a crash."""
+    solutions = []
+    try:
+        with open(filename) as f:
+            for line in f:
+                try:
+                    solutions.append(json.loads(line))
+                except ValueError:
+                    pass
+    except IOError:
+        pass
+    return solutions
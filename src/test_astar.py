@@ -1,3 +1,5 @@
+import unittest
+
 import astar
 import game
 import hx
@@ -53,6 +55,39 @@ def test_units():
     moves = [p[i].move_to_reach(p[i + 1], moves) for i in range(len(p) - 1)]
     print f, moves
 
+def line_neighbours(n):
+    return [n - 1, n + 1]
+
+class TestAstar(unittest.TestCase):
+    def test_priority_queue(self):
+        q = astar.PriorityQueue()
+        q.push(3, 'a')
+        q.push(2, 'b')
+        self.assertIn('a', q)
+        q.push(1, 'a')
+        self.assertEqual(2, len(q))
+        self.assertEqual((1, 'a'), q.pop())
+        self.assertNotIn('a', q)
+        self.assertEqual((2, 'b'), q.pop())
+        self.assertEqual(0, len(q))
+        with self.assertRaises(IndexError):
+            q.pop()
+
+    def test_long_path(self):
+        f, p = astar.astar(0, 5000, lambda a, b: 1, lambda n: abs(5000 - n), line_neighbours)
+        self.assertEqual(5000, f)
+        self.assertEqual(tuple(range(5001)), p)
+
+    def test_max_expansions(self):
+        f, p = astar.astar(0, 50, lambda a, b: 1, lambda n: 0, line_neighbours, max_expansions=10)
+        self.assertEqual((0, ()), (f, p))
+        f, p = astar.astar(0, 50, lambda a, b: 1, lambda n: 0, line_neighbours, max_nodes=10)
+        self.assertEqual((0, ()), (f, p))
+
+    def test_deadline(self):
+        f, p = astar.astar(0, 5000, lambda a, b: 1, lambda n: 0, line_neighbours, deadline=0)
+        self.assertEqual((0, ()), (f, p))
+
 if __name__=="__main__":
     test_hex()
     test_units()
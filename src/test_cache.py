@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+import unittest
+
+import cache
+import game
+
+class TestBoundedCache(unittest.TestCase):
+    def test_get(self):
+        c = cache.BoundedCache()
+        self.assertIsNone(c.get('a'))
+        c['a'] = 1
+        self.assertEqual(1, c.get('a'))
+        self.assertEqual(1, c['a'])
+        with self.assertRaises(KeyError):
+            c['b']
+        self.assertEqual(2, c.stats()['hits'])
+        self.assertEqual(2, c.stats()['misses'])
+        self.assertEqual(1, c.stats()['size'])
+
+    def test_bounded(self):
+        c = cache.BoundedCache(10)
+        for i in range(100):
+            c[i] = i
+            self.assertLessEqual(len(c), 10)
+        self.assertIn(99, c)
+        self.assertNotIn(0, c)
+        self.assertGreater(c.stats()['evictions'], 0)
+
+    def test_recently_used_kept(self):
+        c = cache.BoundedCache(10)
+        c['keep'] = True
+        for i in range(100):
+            self.assertTrue(c['keep'])
+            c[i] = i
+        self.assertIn('keep', c)
+
+    def test_clear(self):
+        c = cache.BoundedCache(10)
+        c['a'] = 1
+        c.clear()
+        self.assertEqual(0, len(c))
+        self.assertNotIn('a', c)
+
+class TestTranspositionTable(unittest.TestCase):
+    def test_visit(self):
+        problem = game.Problem.load('../data/problem_1.json')
+        g = problem.make_game(0, game.BitBoard)
+        other = problem.make_game(0, game.BitBoard)
+        table = cache.TranspositionTable(10)
+        self.assertTrue(table.visit(g))
+        self.assertFalse(table.visit(g))
+        self.assertTrue(table.visit(g, 1))
+        # The same position reached by other moves
+        g.move_unit(game.CMD_E)
+        g.move_unit(game.CMD_SE)
+        self.assertTrue(table.visit(g))
+        other.move_unit(game.CMD_SE)
+        other.move_unit(game.CMD_E)
+        self.assertFalse(table.visit(other))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestBoundedCache))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestTranspositionTable))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import unittest
+
+import clever_solver
+import game
+
+class TestPhrasePath(unittest.TestCase):
+    def setUp(self):
+        self.problem = game.Problem.load('../data/problem_6.json')
+        self.g = self.problem.make_game(0)
+
+    def goal(self):
+        unit = self.g.unit
+        while True:
+            r, new_unit = self.g.move_unit_result_wu(unit, game.CMD_SW, self.g.footprints)
+            if r != game.MOVE_OK:
+                return unit
+            unit = new_unit
+
+    def test_compile_phrases(self):
+        macros = clever_solver.compile_phrases(['Ei!', '#'])
+        self.assertEqual(1, len(macros))
+        self.assertEqual((game.CMD_E, game.CMD_SW, game.CMD_W), macros[0].moves)
+        self.assertEqual(1, macros[0].rows)
+        self.assertEqual(0, macros[0].rotation)
+
+    def test_find_path(self):
+        goal = self.goal()
+        moves = clever_solver.find_path(self.g, goal)
+        for m in moves:
+            self.g.move_unit(m)
+        self.assertEqual(goal, self.g.unit)
+
+    def test_find_phrase_path(self):
+        goal = self.goal()
+        macros = clever_solver.compile_phrases(['ei!'])
+        moves, spelt = clever_solver.find_phrase_path(self.g, goal, macros, {})
+        self.assertIn('ei!', spelt)
+        for m in moves:
+            self.g.move_unit(m)
+        self.assertEqual(goal, self.g.unit)
+
+class TestLookahead(unittest.TestCase):
+    def test_lookahead_moves(self):
+        problem = game.Problem.load('../data/problem_1.json')
+        g = problem.make_game(0)
+        s = clever_solver.CleverSolver()
+        s.lookahead = 2
+        # Solving a one unit game sets up the solver state
+        other = problem.make_game(0)
+        other.max_units = 1
+        s.solve(other, 0)
+        bw, bh = g.size
+        before = (list(g.board.filled_cells), g.unit, g.num_units, g.rnd_seed)
+        moves = s.find_lookahead_moves(g, bw, bh)
+        self.assertEqual(before, (list(g.board.filled_cells), g.unit, g.num_units, g.rnd_seed))
+        for m in moves:
+            g.move_unit(m)
+        self.assertTrue(g.any_locking_move(g.unit))
+
+class TestIncremental(unittest.TestCase):
+    def test_same_solution(self):
+        problem = game.Problem.load('../data/problem_11.json')
+        solutions = []
+        for incremental in (False, True):
+            g = problem.make_game(0, game.BitBoard)
+            g.max_units = 40
+            s = clever_solver.CleverSolver()
+            s.incremental = incremental
+            solutions.append((s.solve(g, 0), g.score))
+        self.assertEqual(solutions[0], solutions[1])
+
+    def test_changed_cells(self):
+        for board_class in (game.Board, game.BitBoard):
+            board = board_class(4, 3)
+            old_rows = board.row_contents()
+            board.lock([(1, 1), (3, 2)])
+            changed = clever_solver.changed_cells(old_rows, board.row_contents(), 4)
+            self.assertEqual([(1, 1), (3, 2)], changed)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestPhrasePath))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestLookahead))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestIncremental))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
+import copy
+import pickle
 import unittest
 
 import game
@@ -54,6 +56,59 @@ class TestBoard(unittest.TestCase):
         board.clear_row(1)
         self.assertListEqual([1, 2, 2, 4], board.ceiling)
 
+    def test_ceiling_clear_lower_row(self):
+        for board_class in (game.Board, game.BitBoard, game.SharedBoard):
+            board = board_class(4, 5, [(0, 0), (1, 2), (0, 3), (1, 3), (2, 3), (3, 3), (3, 4)])
+            board.clear_row(3)
+            self.assertListEqual([1, 3, 5, 4], list(board.ceiling))
+
+    def test_counts(self):
+        for board_class in (game.Board, game.BitBoard, game.SharedBoard):
+            board = board_class(3, 3, [(1, 0), (0, 2), (2, 2)])
+            self.assertListEqual([1, 0, 2], list(board.row_fill))
+            self.assertListEqual([1, 1, 1], list(board.col_fill))
+            # 010 000 101 read from an empty cell
+            self.assertEqual(5, board.transitions)
+            self.assertEqual(2, board.column_holes(1))
+            self.assertEqual(2, board.holes)
+            board.lock([(0, 1), (1, 1), (2, 1)])
+            self.assertEqual(5, board.transitions)
+            board.clear_row(1)
+            self.assertListEqual([0, 1, 2], list(board.row_fill))
+            self.assertListEqual([1, 1, 1], list(board.col_fill))
+            self.assertEqual(board.count_transitions(), board.transitions)
+            self.assertEqual(1, board.holes)
+
+    def test_placement_delta(self):
+        for board_class in (game.Board, game.BitBoard, game.SharedBoard):
+            board = board_class(3, 3, [(1, 0), (0, 2), (2, 2)])
+            cells = [(1, 2), (2, 1)]
+            delta = board.placement_delta(cells)
+            self.assertEqual(1, delta.full_rows)
+            self.assertEqual(1, delta.top)
+            # Only the ceiling of column 2 moves up
+            self.assertEqual(1, delta.height)
+            self.assertEqual(-1, delta.holes)
+            holes = board.holes
+            transitions = board.transitions
+            board.lock(cells)
+            self.assertEqual(holes + delta.holes, board.holes)
+            self.assertEqual(transitions + delta.transitions, board.transitions)
+            self.assertEqual(board.count_transitions(), board.transitions)
+
+    def test_zobrist(self):
+        for board_class in (game.Board, game.BitBoard, game.SharedBoard):
+            board = board_class(3, 3, [(1, 0), (0, 2)])
+            self.assertEqual(board.compute_zobrist(), board.zobrist)
+            self.assertNotEqual(0, board.zobrist)
+            same = board_class(3, 3, [(0, 2), (1, 0)])
+            self.assertEqual(board.zobrist, same.zobrist)
+            board.lock([(0, 1), (1, 1), (2, 1)])
+            board.clear_row(1)
+            self.assertEqual(board_class(3, 3, [(1, 1), (0, 2)]).zobrist, board.zobrist)
+            board.unlock([(0, 1), (1, 1), (2, 1)], [1], [0, 2, 3])
+            self.assertEqual(same.zobrist, board.zobrist)
+
     def test_close_to_filled(self):
         board = game.Board(5, 5, [(1, 2), (2, 2)])
         s = board.close_to_filled(1)
@@ -68,7 +123,215 @@ class TestBoard(unittest.TestCase):
         r = board.reachable_cells((1, 0))
         self.assertSetEqual(set([(0, 0), (1, 0), (2, 0), (2, 1), (2, 2)]), r)
 
+class TestBitBoard(unittest.TestCase):
+    def test_filled_cell(self):
+        board = game.BitBoard(5, 5, [(1, 1), (1, 2)])
+        self.assertTrue(board.filled_cell(1, 1))
+        self.assertTrue(board.filled_cell(1, 2))
+        self.assertFalse(board.filled_cell(2, 1))
+        self.assertFalse(board.filled_cell(2, 2))
+        self.assertListEqual([(1, 1), (1, 2)], list(board.filled_cells))
+
+    def test_filled_row(self):
+        board = game.BitBoard(3, 3, [(0, 1), (1, 1), (2, 1), (1, 2)])
+        self.assertFalse(board.filled_row(0))
+        self.assertTrue(board.filled_row(1))
+        self.assertFalse(board.filled_row(2))
+
+    def test_clear_row(self):
+        board = game.BitBoard(5, 5, [(0, 1), (0, 3)])
+        board.clear_row(3)
+        self.assertFalse(board.filled_cell(0, 1))
+        self.assertTrue(board.filled_cell(0, 2))
+        self.assertFalse(board.filled_cell(0, 3))
+
+    def test_ceiling(self):
+        board = game.BitBoard(4, 4, [(0, 0), (1, 2)])
+        self.assertListEqual([0, 2, 4, 4], board.ceiling)
+        board.lock([(0, 1), (1, 1), (2, 2)])
+        self.assertListEqual([0, 1, 2, 4], board.ceiling)
+        board.lock([(2, 1), (3, 1)])
+        self.assertListEqual([0, 1, 1, 1], board.ceiling)
+        board.clear_row(1)
+        self.assertListEqual([1, 2, 2, 4], board.ceiling)
+
+    def test_unit_fits(self):
+        board = game.BitBoard(4, 4, [(1, 2)])
+        unit = game.Unit.get_or_create_unit((1, 1), [(1, 1), (2, 1)])
+        self.assertTrue(board.unit_fits(unit))
+        self.assertFalse(board.unit_fits(unit.move(hx.DIRECTION_SW)))
+        self.assertFalse(board.unit_fits(unit.move(hx.DIRECTION_W).move(hx.DIRECTION_W)))
+        self.assertFalse(board.unit_fits(unit.move(hx.DIRECTION_E).move(hx.DIRECTION_E)))
+
+    def test_same_as_board(self):
+        problem = game.Problem.load('../data/problem_1.json')
+        moves = [game.CMD_SW, game.CMD_SE] * 200
+        games = [problem.make_game(0, game.Board), problem.make_game(0, game.BitBoard)]
+        for move in moves:
+            for g in games:
+                if g.unit is not None and game.MOVE_ERROR != g.move_unit_result(g.unit, move):
+                    g.move_unit(move)
+        self.assertEqual(games[0].score, games[1].score)
+        self.assertListEqual(list(games[0].board.filled_cells), list(games[1].board.filled_cells))
+        self.assertListEqual(games[0].board.ceiling, games[1].board.ceiling)
+
+class TestSharedBoard(unittest.TestCase):
+    def check_same_as_bitboard(self, filename):
+        problem = game.Problem.load(filename)
+        moves = [game.CMD_SW, game.CMD_SE] * 200
+        games = [problem.make_game(0, game.BitBoard), problem.make_game(0, game.SharedBoard)]
+        for move in moves:
+            for g in games:
+                if g.unit is not None and game.MOVE_ERROR != g.move_unit_result(g.unit, move):
+                    g.move_unit(move)
+        self.assertEqual(games[0].score, games[1].score)
+        self.assertListEqual(list(games[0].board.filled_cells), list(games[1].board.filled_cells))
+        self.assertListEqual(games[0].board.ceiling, list(games[1].board.ceiling))
+        self.assertEqual(games[0].board.zobrist, games[1].board.zobrist)
+
+    def test_same_as_bitboard(self):
+        self.check_same_as_bitboard('../data/problem_1.json')
+
+    def test_wide_same_as_bitboard(self):
+        # 100 columns, more than a word per row
+        self.check_same_as_bitboard('../data/problem_24.json')
+
+    def test_wide_rows(self):
+        width = 130
+        filled = [(col, 2) for col in range(width - 1)] + [(0, 0), (129, 1), (64, 1)]
+        board = game.SharedBoard(width, 3, filled)
+        self.assertTrue(board.filled_cell(129, 1))
+        self.assertFalse(board.filled_row(2))
+        ceiling = list(board.ceiling)
+        board.lock([(129, 2)])
+        self.assertTrue(board.filled_row(2))
+        board.clear_row(2)
+        self.assertListEqual([(0, 1), (64, 2), (129, 2)], list(board.filled_cells))
+        attached = pickle.loads(pickle.dumps(board, pickle.HIGHEST_PROTOCOL))
+        self.assertListEqual([(0, 1), (64, 2), (129, 2)], list(attached.filled_cells))
+        board.unlock([(129, 2)], [2], ceiling)
+        self.assertListEqual(sorted(filled), sorted(attached.filled_cells))
+        self.assertEqual(board.count_transitions(), board.transitions)
+
+    def test_attach(self):
+        board = game.SharedBoard(5, 5, [(1, 1)])
+        attached = pickle.loads(pickle.dumps(board, pickle.HIGHEST_PROTOCOL))
+        self.assertListEqual([(1, 1)], list(attached.filled_cells))
+        board.lock([(2, 3)])
+        self.assertListEqual([(1, 1), (2, 3)], list(attached.filled_cells))
+        self.assertEqual(3, attached.ceiling[2])
+        copied = copy.deepcopy(board)
+        copied.lock([(0, 0)])
+        self.assertFalse(board.filled_cell(0, 0))
+
+class TestGame(unittest.TestCase):
+    def state(self, g):
+        return (list(g.board.filled_cells), list(g.board.ceiling), g.unit, set(g.footprints),
+                g.num_units, g.curr_seed, g.rnd_seed, g.score, g.ls_old,
+                list(g.board.row_fill), list(g.board.col_fill), g.board.transitions, g.board.zobrist)
+
+    def check_undo(self, board_class):
+        problem = game.Problem.load('../data/problem_1.json')
+        g = problem.make_game(0, board_class)
+        states = []
+        records = []
+        moves = [game.CMD_SW, game.CMD_SE] * 200
+        for move in moves:
+            if g.unit is None:
+                break
+            if game.MOVE_ERROR == g.move_unit_result(g.unit, move):
+                continue
+            states.append(self.state(g))
+            records.append(g.apply_move(move))
+        self.assertGreater(g.score, 0)
+        final = self.state(g)
+        while records:
+            g.undo_move(records.pop())
+            self.assertEqual(states.pop(), self.state(g))
+        # Replaying after undoing everything gives the same result
+        for move in moves:
+            if g.unit is None:
+                break
+            if game.MOVE_ERROR != g.move_unit_result(g.unit, move):
+                g.move_unit(move)
+        self.assertEqual(final, self.state(g))
+
+    def test_undo(self):
+        self.check_undo(game.Board)
+
+    def test_undo_bitboard(self):
+        self.check_undo(game.BitBoard)
+
+    def test_undo_sharedboard(self):
+        self.check_undo(game.SharedBoard)
+
+    def test_undo_cleared_row(self):
+        for board_class in (game.Board, game.BitBoard, game.SharedBoard):
+            board = board_class(3, 3, [(0, 1), (0, 2), (1, 2)])
+            units = [game.Unit.get_or_create_unit((0, 0), [(0, 0)])]
+            g = game.Game(board, units, 5, 0)
+            before = self.state(g)
+            records = [g.apply_move(move) for move in [game.CMD_SE, game.CMD_SE, game.CMD_SE]]
+            self.assertEqual([(0, 2)], list(g.board.filled_cells))
+            self.assertEqual(1, g.ls_old)
+            while records:
+                g.undo_move(records.pop())
+            self.assertEqual(before, self.state(g))
+
+    def test_place_unit(self):
+        board = game.Board(3, 3, [(0, 2), (1, 2)])
+        units = [game.Unit.get_or_create_unit((0, 0), [(0, 0)])]
+        g = game.Game(board, units, 5, 0)
+        before = self.state(g)
+        record = g.place_unit(game.Unit.get_or_create_unit((2, 2), [(2, 2)]))
+        self.assertEqual([], list(g.board.filled_cells))
+        self.assertEqual(2, g.num_units)
+        g.undo_placement(record)
+        self.assertEqual(before, self.state(g))
+
+    def test_state_key(self):
+        board = game.BitBoard(4, 4)
+        units = [game.Unit.get_or_create_unit((0, 0), [(0, 0)])]
+        games = [game.Game(copy.deepcopy(board), units, 5, 0) for _ in range(2)]
+        self.assertEqual(games[0].state_key(), games[1].state_key())
+        first = game.Unit.get_or_create_unit((0, 3), [(0, 3)])
+        second = game.Unit.get_or_create_unit((3, 3), [(3, 3)])
+        # The same units placed in the other order give the same position
+        games[0].place_unit(first)
+        self.assertNotEqual(games[0].state_key(), games[1].state_key())
+        games[0].place_unit(second)
+        games[1].place_unit(second)
+        games[1].place_unit(first)
+        self.assertEqual(games[0].state_key(), games[1].state_key())
+
 class TestUnit(unittest.TestCase):
+    def test_footprint(self):
+        unit = game.Unit.get_or_create_unit((1, 1), [(1, 1), (2, 1), (-1, 0)])
+        same = game.Unit.make_footprint((1, 1), [(-1, 0), (1, 1), (2, 1)])
+        other = game.Unit.make_footprint((1, 1), [(1, 1), (2, 1), (0, 0)])
+        pivot = game.Unit.make_footprint((2, 1), [(1, 1), (2, 1), (-1, 0)])
+        self.assertIsInstance(unit.footprint, (int, long))
+        self.assertEqual(same, unit.footprint)
+        self.assertNotEqual(other, unit.footprint)
+        self.assertNotEqual(pivot, unit.footprint)
+        with self.assertRaises(AttributeError):
+            unit.other = None
+
+    def test_zobrist(self):
+        unit = game.Unit.get_or_create_unit((0, 0), [(0, 0), (1, 0)])
+        self.assertEqual(unit.zobrist, game.Unit.get_or_create_unit((0, 0), [(1, 0), (0, 0)]).zobrist)
+        self.assertNotEqual(unit.zobrist, game.Unit.get_or_create_unit((1, 0), [(0, 0), (1, 0)]).zobrist)
+
+    def test_cache_scope(self):
+        unit = game.Unit.get_or_create_unit((0, 0), [(0, 0), (1, 0)])
+        self.assertIs(unit, game.Unit.get_or_create_unit((0, 0), [(0, 0), (1, 0)]))
+        game.Unit.use_cache_scope('test_cache_scope')
+        self.assertEqual(0, game.Unit.cache_stats()['units']['size'])
+        other = game.Unit.get_or_create_unit((0, 0), [(0, 0), (1, 0)])
+        self.assertIsNot(unit, other)
+        self.assertEqual(unit, other)
+        self.assertEqual(hash(unit), hash(other))
+
     def test_to_position(self):
         pivot = (3, 2)
         members = [(2, 1), (3, 1), (4, 1), (3, 2)]
@@ -99,6 +362,9 @@ class TestUnit(unittest.TestCase):
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestBoard))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestBitBoard))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestSharedBoard))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestGame))
     suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestUnit))
     return suite
 
@@ -118,6 +118,13 @@ class TestHex(unittest.TestCase):
         c2 = hx.offset_translate(c0, vector)
         self.assertEqual(c1, c2)
 
+    def test_offset_translate_list(self):
+        cells = [(0, 0), (1, 0), (2, 1), (1, 2), (3, 3)]
+        for c1 in [(4, 1), (2, 4), (0, 3), (5, 0)]:
+            vector = hx.offset_vector((1, 2), c1)
+            expected = [hx.offset_translate(c, vector) for c in cells]
+            self.assertListEqual(expected, hx.offset_translate_list(cells, vector))
+
     def test_offset_circle(self):
         center = (2, 2)
         c1 = hx.offset_circle(center, 1)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+import unittest
+
+import hx
+import hxtable
+
+class TestHexTable(unittest.TestCase):
+    def test_move_list(self):
+        table = hxtable.HexTable(5, 5, 1)
+        cells = [(0, 0), (4, 1), (2, 2), (4, 4)]
+        for direction in hx.DIRECTIONS:
+            expected = [hx.offset_move(c, direction) for c in cells]
+            self.assertListEqual(expected, table.move_list(cells, direction))
+
+    def test_move_list_outside(self):
+        table = hxtable.HexTable(5, 5, 1)
+        cells = [(-1, 0), (3, 3)]
+        self.assertListEqual([(-2, 0), (2, 3)], table.move_list(cells, hx.DIRECTION_W))
+
+    def test_rotate_list(self):
+        table = hxtable.HexTable(8, 8, 2)
+        pivot = (1, 5)
+        cells = [(4, 4), (1, 5), (2, 6)]
+        for direction in (hx.TURN_CW, hx.TURN_CCW):
+            expected = hx.offset_rotate_list(pivot, cells, direction)
+            self.assertListEqual(expected, table.rotate_list(pivot, cells, direction))
+            # Second time from the lookup table
+            self.assertListEqual(expected, table.rotate_list(pivot, cells, direction))
+
+    def test_rotate_list_outside(self):
+        table = hxtable.HexTable(3, 3, 0)
+        pivot = (0, 0)
+        cells = [(2, 0)]
+        expected = hx.offset_rotate_list(pivot, cells, hx.TURN_CW)
+        self.assertListEqual(expected, table.rotate_list(pivot, cells, hx.TURN_CW))
+
+    def test_get_table(self):
+        self.assertIs(hxtable.get_table(4, 6, 2), hxtable.get_table(4, 6, 2))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestHexTable))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+import unittest
+
+import clever_solver
+import game
+import placement
+
+try:
+    import numpy_scoring
+except ImportError:
+    numpy_scoring = None
+
+@unittest.skipIf(numpy_scoring is None, 'numpy is not installed')
+class TestNumpyScoring(unittest.TestCase):
+    def test_same_as_python(self):
+        problem = game.Problem.load('../data/problem_6.json')
+        g = problem.make_game(0)
+        for move in [game.CMD_SW, game.CMD_SE] * 15:
+            if g.unit is not None and game.MOVE_ERROR != g.move_unit_result(g.unit, move):
+                g.move_unit(move)
+        solver = clever_solver.CleverSolver()
+        solver.verbosity = 0
+        bw, bh = g.size
+        solver.placements = placement.get_table(bw, bh, g.units)
+        self.assertGreater(g.score, 0)
+        lockable = solver.compute_lockable(g, solver.compute_possible(g, bw, bh))
+        expected = solver.compute_scores(g, lockable, bw, bh)
+        self.assertDictEqual(expected, numpy_scoring.compute_scores(g.board, lockable, solver.weights))
+
+    def test_empty(self):
+        self.assertDictEqual({}, numpy_scoring.compute_scores(game.Board(5, 5), [], clever_solver.WEIGHTS))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestNumpyScoring))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+import unittest
+
+import game
+import placement
+
+class TestPlacementTable(unittest.TestCase):
+    def setUp(self):
+        self.problem = game.Problem.load('../data/problem_1.json')
+        self.g = self.problem.make_game(0)
+
+    def test_inside_board(self):
+        table = placement.PlacementTable(self.problem.width, self.problem.height)
+        placements = table.get(self.g.unit)
+        self.assertGreater(len(placements), 0)
+        for unit in placements:
+            for col, row in unit.members:
+                self.assertTrue(0 <= col < self.problem.width and 0 <= row < self.problem.height)
+
+    def test_touched_cells(self):
+        table = placement.PlacementTable(self.problem.width, self.problem.height)
+        by_cell = table.touched_cells(self.g.unit)
+        for unit in table.get(self.g.unit):
+            for cell in unit.members:
+                self.assertIn(unit, by_cell[cell])
+        for col, row in by_cell:
+            self.assertTrue(0 <= col < self.problem.width and 0 <= row < self.problem.height)
+
+    def test_cut_short(self):
+        table = placement.PlacementTable(self.problem.width, self.problem.height)
+        def check_time():
+            raise ValueError()
+        with self.assertRaises(ValueError):
+            table.get(self.g.unit, check_time)
+        self.assertEqual({}, table.placements)
+        self.assertGreater(len(table.get(self.g.unit)), 0)
+
+    def test_shared(self):
+        table = placement.get_table(self.problem.width, self.problem.height, self.problem.units)
+        self.assertIs(table, placement.get_table(self.problem.width, self.problem.height, self.problem.units))
+        self.assertIsNot(table, placement.get_table(self.problem.width + 1, self.problem.height, self.problem.units))
+
+    def test_only_last_kept(self):
+        table = placement.get_table(self.problem.width, self.problem.height, self.problem.units)
+        table.get(self.g.unit)
+        placement.get_table(self.problem.width + 1, self.problem.height, self.problem.units)
+        self.assertEqual({}, table.placements)
+        self.assertIsNot(table, placement.get_table(self.problem.width, self.problem.height, self.problem.units))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestPlacementTable))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -17,6 +17,32 @@ class TestPower(unittest.TestCase):
         s = power.subst('pppbalpppppbalpp', '245')
         self.assertEqual('ppp245ppppp245pp', s)
 
+    def test_find(self):
+        matcher = power.PhraseMatcher(['ei!', 'i!'])
+        self.assertEqual([(1, 0), (2, 1)], sorted(matcher.find('pbap')))
+
+    def test_substitute_several(self):
+        s = power.substitute('bapppllpbap', ['ei!', 'ol'])
+        self.assertEqual('ei!pp' + 'ol' + 'pei!', s)
+
+    def test_substitute_bonus(self):
+        # 'ei!' fits three times, but giving up two of them for '!e' scores more
+        s = power.substitute('bapbapbap', ['ei!', '!e'])
+        self.assertIn('ei!', s)
+        self.assertIn('!e', s)
+
+    def test_substitute_unknown(self):
+        self.assertEqual('pbap', power.substitute('pbap', ['#']))
+
+    def test_count_phrase(self):
+        self.assertEqual(2, power.count_phrase('aaa', 'aa'))
+        self.assertEqual(0, power.count_phrase('abc', 'd'))
+
+    def test_power_score(self):
+        score, counts = power.power_score('ei!xei!', ['Ei!', 'yuggoth'])
+        self.assertEqual(2 * 3 * 2 + 300, score)
+        self.assertDictEqual({'Ei!': 2, 'yuggoth': 0}, counts)
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestPower))
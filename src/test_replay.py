@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import unittest
+
+import game
+import replay
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.problem = game.Problem.load('../data/problem_1.json')
+
+    def test_legal(self):
+        result = replay.replay(self.problem, 0, 'aaaaaaaaaa', ['aa'])
+        self.assertIsNone(result['error'])
+        self.assertEqual(9 * 2 * 2 + 300, result['power_score'])
+
+    def test_same_as_game(self):
+        g = self.problem.make_game(0)
+        cmds = []
+        while g.unit is not None:
+            for cmd in [game.CMD_SW, game.CMD_SE, game.CMD_SW]:
+                if g.unit is None:
+                    break
+                g.move_unit(cmd)
+                cmds.append(game.CMD_CHARS[cmd][0])
+        result = replay.replay(self.problem, 0, ''.join(cmds))
+        self.assertIsNone(result['error'])
+        self.assertEqual(g.score, result['move_score'])
+
+    def test_repeated_position(self):
+        result = replay.replay(self.problem, 0, 'pb')
+        self.assertIsNotNone(result['error'])
+
+    def test_after_end(self):
+        g = self.problem.make_game(0)
+        cmds = []
+        while g.unit is not None:
+            g.move_unit(game.CMD_SW)
+            cmds.append('a')
+        result = replay.replay(self.problem, 0, ''.join(cmds) + 'a')
+        self.assertIsNotNone(result['error'])
+
+    def test_invalid_character(self):
+        result = replay.replay(self.problem, 0, 'a#')
+        self.assertIsNotNone(result['error'])
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestReplay))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
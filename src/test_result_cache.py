@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+import shutil
+import tempfile
+import unittest
+
+import result_cache
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_put_get(self):
+        cache = result_cache.ResultCache(self.directory)
+        key = cache.key('abc', 1, 'CleverSolver', {'board': 'bit'}, None)
+        self.assertIsNone(cache.get(key))
+        solution = {"problemId": 1, "seed": 1, "solution": "ppp"}
+        cache.put(key, solution)
+        self.assertEqual(solution, cache.get(key))
+        self.assertEqual(solution, result_cache.ResultCache(self.directory).get(key))
+
+    def test_key(self):
+        cache = result_cache.ResultCache(self.directory)
+        key = cache.key('abc', 1, 'CleverSolver', {'board': 'bit'}, ['ei!'])
+        self.assertEqual(key, cache.key('abc', 1, 'CleverSolver', {'board': 'bit'}, ['ei!']))
+        self.assertNotEqual(key, cache.key('abd', 1, 'CleverSolver', {'board': 'bit'}, ['ei!']))
+        self.assertNotEqual(key, cache.key('abc', 2, 'CleverSolver', {'board': 'bit'}, ['ei!']))
+        self.assertNotEqual(key, cache.key('abc', 1, 'SearchSolver', {'board': 'bit'}, ['ei!']))
+        self.assertNotEqual(key, cache.key('abc', 1, 'CleverSolver', {'board': 'list'}, ['ei!']))
+        self.assertNotEqual(key, cache.key('abc', 1, 'CleverSolver', {'board': 'bit'}, None))
+
+    def test_evict(self):
+        cache = result_cache.ResultCache(self.directory)
+        keys = [cache.key('abc', seed, 'CleverSolver', {}, None) for seed in range(3)]
+        for seed, key in enumerate(keys):
+            cache.put(key, {"seed": seed, "solution": "p" * 100})
+        cache.max_bytes = cache.size - 1
+        cache.evict()
+        self.assertEqual(2, len(cache.files()))
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestResultCache))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+import multiprocessing as mp
+import os
+import time
+import unittest
+
+import shared
+
+def hold_buffer(conn):
+    buf = shared.SharedBuffer(64)
+    conn.send(buf.path)
+    time.sleep(60)
+
+class TestSharedBuffer(unittest.TestCase):
+    def test_attach(self):
+        buf = shared.SharedBuffer(64)
+        buf.map[0] = 'x'
+        attached = shared.SharedBuffer.attach(buf.name, 64)
+        self.assertEqual('x', attached.map[0])
+        path = buf.path
+        attached.close()
+        self.assertTrue(os.path.exists(path))
+        buf.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_terminated(self):
+        parent_conn, child_conn = mp.Pipe()
+        process = mp.Process(target=hold_buffer, args=(child_conn,))
+        process.start()
+        path = parent_conn.recv()
+        self.assertTrue(os.path.exists(path))
+        process.terminate()
+        process.join()
+        self.assertFalse(os.path.exists(path))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestSharedBuffer))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+
+import clever_solver
+import game
+import cache
+import random_solver
+import result_cache
+import search_solver
+import solver
+
+class TestPortfolio(unittest.TestCase):
+    def test_best_solutions(self):
+        s = solver.BaseSolver()
+        results = [(0, {"score": 5}), (2, {"score": 1}), (1, {"score": 7}), (3, {"score": 0})]
+        best = list(s.best_solutions(iter(results), [0, 0, 1, 1]))
+        self.assertEqual([(0, {"score": 7}), (1, {"score": 1})], best)
+
+    def test_variant(self):
+        s = clever_solver.CleverSolver()
+        s.board = 'bit'
+        s.deadline = 10.0
+        configs = s.portfolio(3)
+        self.assertEqual(3, len(configs))
+        self.assertIs(s, configs[0])
+        self.assertIsInstance(configs[1], random_solver.RandomSolver)
+        self.assertEqual(('bit', 10.0), (configs[1].board, configs[1].deadline))
+        self.assertEqual(20, configs[2].weights['filled'])
+        self.assertEqual(10, s.weights['filled'])
+        other = s.variant(random_solver.RandomSolver, restart=2)
+        self.assertIsInstance(other, random_solver.RandomSolver)
+        self.assertEqual(('bit', 10.0, 2), (other.board, other.deadline, other.restart))
+
+    def test_restarts(self):
+        configs = random_solver.RandomSolver().portfolio(4)
+        self.assertEqual([0, 1, 2, 3], [c.restart for c in configs])
+        configs = clever_solver.CleverSolver().portfolio(8)
+        restarts = [c.restart for c in configs if isinstance(c, random_solver.RandomSolver)]
+        self.assertEqual([0, 1, 2], restarts)
+
+class TestRunSeed(unittest.TestCase):
+    def test_setup_error(self):
+        problem = game.Problem.load('../data/problem_1.json')
+        s = random_solver.RandomSolver()
+        # No such seed, making the game fails
+        solution = s.runSeed(problem, 0, len(problem.source_seeds), 0, None)
+        self.assertIn("error", solution)
+        self.assertEqual(0, solution["score"])
+
+class TestFinishSolution(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = result_cache.ResultCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def finish(self, key, **extra):
+        solution = {"problemId": 1, "seed": 0, "solution": "ppp", "score": 5}
+        solution.update(extra)
+        solver.BaseSolver().finish_solution(self.cache, key, False, solution)
+        self.assertEqual({"problemId": 1, "seed": 0, "solution": "ppp"}, solution)
+        return self.cache.get(key)
+
+    def test_cached(self):
+        self.assertIsNotNone(self.finish('a'))
+
+    def test_not_cached(self):
+        self.assertIsNone(self.finish('a', error='timeout'))
+        self.assertIsNone(self.finish('b', budget_cut=True))
+
+    def test_budget_options(self):
+        def key(time, cores, memory):
+            args = argparse.Namespace(board='bit', time=time, cores=cores, memory=memory)
+            return self.cache.key('abc', 0, 'CleverSolver', solver.cache_options(args), None)
+        self.assertIsNotNone(self.finish(key(999999, 1, None)))
+        # Only solutions that got the full budget are cached, another budget finds them
+        self.assertIsNotNone(self.cache.get(key(500, 4, None)))
+        self.assertIsNotNone(self.cache.get(key(999999, 2, 1000)))
+
+class TestResume(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'solutions.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def truncate(self, content):
+        with open(self.filename, 'wb') as f:
+            f.write(content)
+        solver.truncate_partial_line(self.filename, chunk_size=8)
+        with open(self.filename, 'rb') as f:
+            return f.read()
+
+    def test_truncated_record(self):
+        lines = '{"problemId": 1, "seed": 0, "solution": "ppp"}\n{"problemId": 1, "seed": 5, "solution": "a"}\n'
+        self.assertEqual(lines, self.truncate(lines + '{"problemId": 1, "se'))
+        # Appending after it gives only complete records
+        with open(self.filename, 'a') as f:
+            f.write('{"problemId": 1, "seed": 7, "solution": ""}\n')
+        self.assertEqual([0, 5, 7], [s["seed"] for s in solver.read_solutions(self.filename)])
+        self.assertEqual(lines, self.truncate(lines))
+        self.assertEqual('', self.truncate('{"problemId": 1, "se'))
+
+class TestBudget(unittest.TestCase):
+    def setUp(self):
+        self.s = solver.BaseSolver()
+        self.s.start_budget()
+        self.s.job_deadline = 100.0
+
+    def test_level(self):
+        s = self.s
+        self.assertEqual(solver.BUDGET_FULL, s.choose_level(90.0, 100))
+        self.assertEqual(90.0 + solver.UNIT_TIME_SHARE * 10.0 / 100, s.unit_deadline)
+        s.unit_times = {solver.BUDGET_FULL: 0.2, solver.BUDGET_CHEAP: 0.05}
+        self.assertEqual(solver.BUDGET_CHEAP, s.choose_level(90.0, 100))
+        s.unit_times[solver.BUDGET_CHEAP] = 0.5
+        self.assertEqual(solver.BUDGET_GREEDY, s.choose_level(90.0, 100))
+        self.assertEqual(solver.BUDGET_GREEDY, s.choose_level(99.9, 100))
+        self.assertEqual(solver.BUDGET_STOP, s.choose_level(100.0, 100))
+
+    def test_share_time(self):
+        # Even cores
+        self.assertEqual(1.0, solver.share_time([5, 5, 5, 5], 2, 10.0))
+        # No more jobs than cores, every job can take all the time
+        self.assertIsNone(solver.share_time([100, 1], 4, 10.0))
+        # The largest job can't use its share, the small ones get the rest
+        self.assertEqual(1.0, solver.share_time([100, 5, 5, 5, 5], 3, 10.0))
+
+    def test_memory(self):
+        s = self.s
+        s.job_deadline = None
+        s.memory_limit = 1
+        self.assertEqual(solver.BUDGET_CHEAP, s.choose_level(90.0, 100))
+        # The current memory is checked, not the peak, so freeing memory gets full back
+        s.memory_limit = 2 * solver.resident_memory()
+        self.assertEqual(solver.BUDGET_FULL, s.choose_level(90.0, 100))
+
+    def test_retry(self):
+        s = self.s
+        s.unit_times = {solver.BUDGET_FULL: 0.2}
+        levels = [s.choose_level(90.0, 100) for i in range(10)]
+        # Full is tried again once its decayed time per unit fits
+        self.assertEqual(solver.BUDGET_CHEAP, levels[0])
+        self.assertEqual(solver.BUDGET_FULL, levels[-1])
+
+    def test_check_time(self):
+        s = self.s
+        s.unit_deadline = 0
+        with self.assertRaises(solver.OutOfTime):
+            s.check_time()
+        self.assertTrue(s.unit_aborted)
+        self.assertTrue(s.budget_cut)
+        s.budget_level(100)
+        self.assertFalse(s.unit_aborted)
+
+    def test_budget_cut(self):
+        s = self.s
+        s.job_deadline = None
+        s.budget_level(100)
+        self.assertFalse(s.budget_cut)
+        s.job_deadline = 0
+        s.budget_level(100)
+        self.assertTrue(s.budget_cut)
+
+class TestSearchSolver(unittest.TestCase):
+    def test_lock_scores(self):
+        g = game.Problem.load('../data/problem_1.json').make_game(0, game.BitBoard)
+        scores = {}
+        search_solver.do_solve(g, [], scores)
+        # Locks score by where the unit locked, not by the unit spawned after them
+        self.assertGreater(len(set(scores.values())), 1)
+        pruned = {}
+        search_solver.do_solve(g, [], pruned, cache.TranspositionTable())
+        self.assertEqual(max(scores.values()), max(pruned.values()))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestPortfolio))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestRunSeed))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestFinishSolution))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestResume))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestSearchSolver))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestBudget))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import contextlib
+import time
+
+class PhaseTimer(object):
+    """
+    Accumulates the time spent in named phases and named event counters, cheap enough to
+    be left on in production runs.
+    """
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.maxima = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - start)
+
+    def add(self, name, elapsed):
+        self.totals[name] = self.totals.get(name, 0.0) + elapsed
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.maxima[name] = max(self.maxima.get(name, 0.0), elapsed)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        phases = {}
+        for name in self.totals:
+            phases[name] = {'total': self.totals[name],
+                            'count': self.counts[name],
+                            'max': self.maxima[name],
+            }
+        return {'phases': phases,
+                'counters': dict(self.counters),
+        }
+
+    def report(self):
+        lines = []
+        total = sum(self.totals.values())
+        for name in sorted(self.totals, key=self.totals.get, reverse=True):
+            lines.append('%-20s %9.3fs %5.1f%% %7d calls %9.3fs max' % (
+                name, self.totals[name], 100.0 * self.totals[name] / total if total else 0.0,
+                self.counts[name], self.maxima[name]))
+        for name in sorted(self.counters):
+            lines.append('%-20s %10d' % (name, self.counters[name]))
+        return '\n'.join(lines)
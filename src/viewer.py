@@ -183,44 +183,7 @@ class Viewer(wx.Frame):
         return True
 
     def DirectionFromCommand(self, c):
-        dirs = {"p": game.CMD_W,
-                "'": game.CMD_W,
-                "!": game.CMD_W,
-                ".": game.CMD_W,
-                "0": game.CMD_W,
-                "3": game.CMD_W,
-                "b": game.CMD_E,
-                "c": game.CMD_E,
-                "e": game.CMD_E,
-                "f": game.CMD_E,
-                "y": game.CMD_E,
-                "2": game.CMD_E,
-                "a": game.CMD_SW,
-                "g": game.CMD_SW,
-                "h": game.CMD_SW,
-                "i": game.CMD_SW,
-                "j": game.CMD_SW,
-                "4": game.CMD_SW,
-                "l": game.CMD_SE,
-                "m": game.CMD_SE,
-                "n": game.CMD_SE,
-                "o": game.CMD_SE,
-                " ": game.CMD_SE,
-                "5": game.CMD_SE,
-                "d": game.CMD_CW,
-                "q": game.CMD_CW,
-                "r": game.CMD_CW,
-                "v": game.CMD_CW,
-                "z": game.CMD_CW,
-                "1": game.CMD_CW,
-                "k": game.CMD_CCW,
-                "s": game.CMD_CCW,
-                "t": game.CMD_CCW,
-                "u": game.CMD_CCW,
-                "w": game.CMD_CCW,
-                "x": game.CMD_CCW
-        }
-        return dirs[c]
+        return game.CHAR_CMDS[c]
 
     def Run(self, steps):
         while steps > 0 and self._game_step < len(self._commands):